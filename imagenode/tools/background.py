@@ -0,0 +1,144 @@
+"""background: background models that find the motion pixels of an ROI
+
+The motion detector compares each blurred grayscale ROI with a model of the
+ROI background. The model marks the pixels that differ from the background
+as motion pixels. The motion detector then dilates the motion pixels, finds
+their contours and decides if the ROI is 'moving' or 'still'. The
+background_model option of a motion detector chooses one of:
+
+    'average': a running average of the ROI images (the default); pixels that
+               differ from it by more than delta_threshold are motion pixels
+    'difference': the previous ROI image; the cheapest model, but only the
+                  parts of a moving object that changed since the last frame
+                  are motion pixels
+    'mog2': OpenCV's Gaussian mixture model background subtractor, which
+            learns pixels that vary, e.g., with lighting flicker or leaves
+    'knn': OpenCV's K nearest neighbours background subtractor
+
+The 'mog2' and 'knn' models use their OpenCV default thresholds instead of
+delta_threshold and cost several times more CPU per frame than 'average'.
+The tests/unit_tests/background_models_test.py program compares them.
+
+Copyright (c) 2017 by Jeff Bass.
+License: MIT, see LICENSE for more details.
+"""
+
+import cv2
+import numpy as np
+
+BACKGROUND_MODELS = ('average', 'difference', 'mog2', 'knn')
+
+
+class RunningAverage:
+    """ A weighted running average of the ROI images as the background
+
+    The average is kept as float32, which is ample precision for a running
+    average of 8 bit images, at half the memory of float64. Every image is
+    written into a buffer allocated once, on the first frame, at ROI size.
+
+    Parameters:
+        delta_threshold (int): least difference from the average of a motion
+            pixel
+        alpha (float): weight of each new image in the average
+    """
+
+    def __init__(self, delta_threshold, alpha=0.5):
+        self.delta_threshold = delta_threshold
+        self.alpha = alpha
+        self.average = None
+
+    def apply(self, gray):
+        """ Add gray to the background and return its motion pixels
+
+        Parameters:
+            gray (OpenCV image): blurred grayscale ROI
+
+        Returns:
+            frame_delta (OpenCV image): difference from the background
+            thresholded (OpenCV image): 255 for motion pixels, else 0
+        """
+        if self.average is None:  # first image is the first average
+            self.average = gray.astype(np.float32)
+            self.average_gray = np.empty_like(gray)  # average as uint8
+            self.frame_delta = np.empty_like(gray)
+            self.thresholded = np.empty_like(gray)
+        else:
+            cv2.accumulateWeighted(gray, self.average, self.alpha)
+        cv2.convertScaleAbs(self.average, dst=self.average_gray)
+        cv2.absdiff(gray, self.average_gray, dst=self.frame_delta)
+        cv2.threshold(self.frame_delta, self.delta_threshold, 255,
+                      cv2.THRESH_BINARY, dst=self.thresholded)
+        return self.frame_delta, self.thresholded
+
+
+class FrameDifference:
+    """ The previous ROI image as the background
+
+    Parameters:
+        delta_threshold (int): least difference from the previous image of a
+            motion pixel
+    """
+
+    def __init__(self, delta_threshold):
+        self.delta_threshold = delta_threshold
+        self.previous = None
+
+    def apply(self, gray):
+        """ Return the motion pixels of gray and keep it as the background
+
+        Parameters and return values are those of RunningAverage.apply().
+        """
+        if self.previous is None:
+            self.previous = gray.copy()
+            self.frame_delta = np.empty_like(gray)
+            self.thresholded = np.empty_like(gray)
+        cv2.absdiff(gray, self.previous, dst=self.frame_delta)
+        np.copyto(self.previous, gray)
+        cv2.threshold(self.frame_delta, self.delta_threshold, 255,
+                      cv2.THRESH_BINARY, dst=self.thresholded)
+        return self.frame_delta, self.thresholded
+
+
+class Subtractor:
+    """ An OpenCV BackgroundSubtractor as the background
+
+    Shadow detection is turned off, so the foreground mask holds only 255 for
+    motion pixels and 0 for the others. The mask is both the frame_delta and
+    the thresholded image.
+
+    Parameters:
+        subtractor (cv2.BackgroundSubtractor): e.g., from
+            cv2.createBackgroundSubtractorMOG2(detectShadows=False)
+    """
+
+    def __init__(self, subtractor):
+        self.subtractor = subtractor
+        self.mask = None
+
+    def apply(self, gray):
+        """ Add gray to the background and return its motion pixels
+
+        Parameters and return values are those of RunningAverage.apply().
+        """
+        self.mask = self.subtractor.apply(gray, self.mask)
+        return self.mask, self.mask
+
+
+def background_model(name, delta_threshold):
+    """ Return a new background model for a motion detector
+
+    Parameters:
+        name (str): one of BACKGROUND_MODELS
+        delta_threshold (int): the motion detector's delta_threshold setting
+    """
+    if name == 'average':
+        return RunningAverage(delta_threshold)
+    elif name == 'difference':
+        return FrameDifference(delta_threshold)
+    elif name == 'mog2':
+        return Subtractor(
+            cv2.createBackgroundSubtractorMOG2(detectShadows=False))
+    elif name == 'knn':
+        return Subtractor(cv2.createBackgroundSubtractorKNN(detectShadows=False))
+    raise ValueError('Unknown background_model: {}; use one of {}'.format(
+        name, ', '.join(BACKGROUND_MODELS)))
@@ -0,0 +1,107 @@
+"""bufferpool: a pool of image buffers that are reused once released
+
+Each frame that is transformed (flipped or resized) as a whole, e.g., to be
+sent, and each frame read from a webcam, needs a full size image. Allocating
+a new one for every frame means large, steady allocations, and on a
+Raspberry Pi with 1 GB of memory the freed images fragment the heap. A
+BufferPool hands out image buffers of one shape and reuses each one once it
+has been released by everything that used it: the cam_q, the send_q, the
+EncodeCache and any views of it.
+
+A buffer is released when nothing but the pool refers to it. Python keeps a
+reference count for every object, and every numpy view of a buffer refers to
+it through its .base, so sys.getrefcount() tells when a buffer is free again
+without any explicit release calls. The count of a free buffer depends on the
+temporary references the interpreter holds while counting, so it is measured
+once, when the pool is created, by running the same search on a probe buffer
+that nothing else refers to.
+
+Copyright (c) 2017 by Jeff Bass.
+License: MIT, see LICENSE for more details.
+"""
+
+import sys
+import threading
+import numpy as np
+
+
+def find_free(buffers, free_refcount):
+    """ Return the first buffer with at most free_refcount references, or None
+
+    Parameters:
+        buffers (list): buffers of a BufferPool
+        free_refcount (int): sys.getrefcount() of a buffer in this search when
+            nothing but the list refers to it
+    """
+    for buf in buffers:
+        if sys.getrefcount(buf) <= free_refcount:
+            return buf
+    return None
+
+
+def measure_free_refcount():
+    """ Return the free_refcount for find_free() in this interpreter
+
+    A probe buffer referred to by nothing but its list is searched for with
+    increasing counts; the first count that finds it is the count of a free
+    buffer. A buffer held anywhere else always has a higher count.
+    """
+    probe = [np.empty(0)]
+    for free_refcount in range(1, 16):
+        if find_free(probe, free_refcount) is not None:
+            return free_refcount
+    raise RuntimeError('Could not measure the reference count of a free buffer')
+
+
+class BufferPool:
+    """ A pool of at most size image buffers of one shape and dtype
+
+    Buffers are allocated when first needed, so memory is only used for the
+    most buffers ever in use at the same time. Once the pool has warmed up,
+    get() allocates nothing. If all size buffers are in use, get() returns a
+    new image that is not kept in the pool, and counts it as an overflow.
+
+    Parameters:
+        size (int): most buffers to keep in the pool
+    """
+
+    def __init__(self, size=8):
+        self.size = size
+        self.shape = None
+        self.dtype = None
+        self.buffers = []
+        self.lock = threading.Lock()
+        self.free_refcount = measure_free_refcount()
+        self.reused = 0
+        self.overflow = 0
+
+    def get(self, shape, dtype=np.uint8):
+        """ Return a free buffer of shape and dtype; its contents are garbage
+
+        If shape or dtype differ from those of the pooled buffers, e.g., when
+        a camera changes resolution, the pool is emptied and starts over.
+
+        Parameters:
+            shape (tuple): shape of the image, e.g., (480, 640, 3)
+            dtype (numpy dtype): dtype of the image
+        """
+        with self.lock:
+            if shape != self.shape or dtype != self.dtype:
+                self.shape, self.dtype = shape, dtype
+                self.buffers = []
+            buf = find_free(self.buffers, self.free_refcount)
+            if buf is not None:
+                self.reused += 1
+                return buf
+            buf = np.empty(shape, dtype)
+            if len(self.buffers) < self.size:
+                self.buffers.append(buf)
+            else:
+                self.overflow += 1
+            return buf
+
+    def stats_text(self):
+        """ Return the buffer counts as text, e.g. for a heartbeat message
+        """
+        return 'buffers={} reused={} overflow={}'.format(
+            len(self.buffers), self.reused, self.overflow)
@@ -0,0 +1,121 @@
+"""encodecache: a bounded cache of jpg compressed images
+
+The same captured frame can be appended to the send_q more than once: as a
+continuous image, again when a detected event replays the images in the
+camera's cam_q, and again for each detector of the same camera. The
+EncodeCache keeps the jpg_buffer of each recently compressed frame so that
+each frame is only compressed once.
+
+Text messages, such as heartbeats, sensor readings and detector events, are
+sent with a constant placeholder image. These images are added to the
+EncodeCache as constants, compressed once at startup and never evicted, so
+sending a text message costs no compression at all.
+
+Copyright (c) 2017 by Jeff Bass.
+License: MIT, see LICENSE for more details.
+"""
+
+import threading
+from collections import OrderedDict
+
+
+class EncodeCache:
+    """ A least recently used cache of jpg_buffers keyed by image and quality
+
+    Images are keyed by identity (id()), not by content, since comparing
+    frame contents would cost nearly as much as compressing them. Each cached
+    image is kept in the cache with its jpg_buffer, so its id() can't be
+    reused by a new image while it is cached. The cache size should be the
+    total length of the cam_q's, so that a frame stays cached for as long as
+    it can be replayed from a cam_q.
+
+    get() is thread safe, so it can be called by the encode_threads pool.
+
+    Parameters:
+        encode (func): encode(image, quality) returns a jpg_buffer
+        maxlen (int): maximum number of jpg_buffers to keep
+        jpg_ratio (multiprocessing.Value): if not None, updated with a moving
+            average of the ratio of jpg size to image size (not of constants)
+    """
+
+    def __init__(self, encode, maxlen=50, jpg_ratio=None):
+        self.encode = encode
+        self.maxlen = maxlen
+        self.jpg_ratio = jpg_ratio
+        self.cache = OrderedDict()  # (id(image), quality) -> (image, jpg_buffer)
+        self.constants = {}  # id(image) -> (image, jpg_buffer)
+        self.constant_buffers = set()  # id(jpg_buffer) of constant images
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def add_constant(self, image, jpg_buffer=None):
+        """ Add a placeholder image that is never changed and never evicted
+
+        Parameters:
+            image (OpenCV image): constant image, e.g., a tiny blank image
+            jpg_buffer (buffer): image already compressed; compressed if None
+        """
+        if jpg_buffer is None:
+            jpg_buffer = self.encode(image, 95)
+        self.constants[id(image)] = (image, jpg_buffer)
+        self.constant_buffers.add(id(jpg_buffer))
+
+    def is_constant(self, jpg_buffer):
+        """ True if jpg_buffer is the jpg of a constant image
+        """
+        return id(jpg_buffer) in self.constant_buffers
+
+    def get(self, image, quality):
+        """ Return the jpg_buffer of image, compressing it only if not cached
+
+        A constant image is always returned at the quality it was added with.
+
+        Parameters:
+            image (OpenCV image): image to compress
+            quality (int): jpg quality, 0 to 100
+        """
+        constant = self.constants.get(id(image))
+        if constant and constant[0] is image:
+            return constant[1]
+        key = (id(image), quality)
+        with self.lock:
+            cached = self.cache.get(key)
+            if cached and cached[0] is image:
+                self.cache.move_to_end(key)
+                self.hits += 1
+                return cached[1]
+        jpg_buffer = self.encode(image, quality)  # outside lock; releases GIL
+        if self.jpg_ratio is not None:
+            self.jpg_ratio.value = (0.9 * self.jpg_ratio.value
+                                    + 0.1 * len(jpg_buffer) / image.nbytes)
+        with self.lock:
+            self.misses += 1
+            self.cache[key] = (image, jpg_buffer)
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.maxlen:
+                self.cache.popitem(last=False)
+        return jpg_buffer
+
+    def put(self, image, quality, jpg_buffer):
+        """ Add the jpg_buffer of an image that was compressed elsewhere
+
+        E.g., an image decoded from a jpg kept in a camera's cam_q is added
+        with that jpg, so that sending it costs no compression.
+
+        Parameters:
+            image (OpenCV image): image of the jpg_buffer
+            quality (int): jpg quality the jpg_buffer was compressed with
+            jpg_buffer (buffer): the compressed image
+        """
+        key = (id(image), quality)
+        with self.lock:
+            self.cache[key] = (image, jpg_buffer)
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.maxlen:
+                self.cache.popitem(last=False)
+
+    def stats_text(self):
+        """ Return the hit and miss counts as text, e.g. for a heartbeat message
+        """
+        return 'hits={} misses={}'.format(self.hits, self.misses)
@@ -0,0 +1,166 @@
+"""framearchive: record and replay raw camera frames in an indexed archive
+
+A frame archive is a pair of append-only files. The '.frames' file holds a
+small fixed size header followed by uncompressed frames, all the same shape,
+at a fixed stride. The '.index' file holds one float64 capture timestamp per
+frame. Because every frame is at a known offset, the '.frames' file can be
+opened with np.memmap and any frame can be read without copying or decoding.
+
+Copyright (c) 2017 by Jeff Bass.
+License: MIT, see LICENSE for more details.
+"""
+
+import os
+import struct
+import logging
+import numpy as np
+
+MAGIC = b'INFRAMES'
+HEADER_FORMAT = '<8sIII'  # magic, height, width, channels
+HEADER_SIZE = 64  # header is padded so frames start at an aligned offset
+
+def archive_paths(path):
+    """ Return the (frames, index) file paths for an archive base path
+
+    Parameters:
+        path (str): archive path, with or without the '.frames' extension
+    """
+    path = os.path.expanduser(path)
+    if path.endswith('.frames'):
+        path = path[:-len('.frames')]
+    return path + '.frames', path + '.index'
+
+def is_frame_archive(path):
+    """ Return True if path names an existing frame archive
+    """
+    frames_path, index_path = archive_paths(path)
+    return os.path.isfile(frames_path) and os.path.isfile(index_path)
+
+
+class FrameArchiveWriter:
+    """ Appends frames and their capture timestamps to a frame archive
+
+    The frame shape is set by the first frame written to a new archive. When
+    appending to an existing archive, frames must match the archive shape; if
+    the first frame doesn't, e.g., because resize_width was changed, open()
+    raises a ValueError rather than recording nothing. A later frame that
+    doesn't match the archive shape is not written, and a warning is logged
+    the first time.
+
+    Parameters:
+        path (str): archive base path; '.frames' & '.index' are appended
+        max_frames (int): stop recording after this many frames (None = no limit)
+    """
+
+    def __init__(self, path, max_frames=None):
+        self.frames_path, self.index_path = archive_paths(path)
+        self.max_frames = max_frames
+        self.shape = None
+        self.frame_count = 0
+        self.frames_file = None
+        self.index_file = None
+        self.shape_warned = False
+        if os.path.isfile(self.frames_path):  # append to existing archive
+            archive = FrameArchive(self.frames_path)
+            self.shape = archive.shape
+            self.frame_count = len(archive)
+            archive.close()
+
+    def open(self, shape):
+        """ Open the archive files, writing the header if the archive is new
+        """
+        height, width = shape[0], shape[1]
+        channels = shape[2] if len(shape) > 2 else 1
+        new_archive = self.shape is None
+        if not new_archive and tuple(shape) != self.shape:
+            raise ValueError('Cannot append frames of shape {} to frame archive '
+                             '{} of shape {}; record to a new archive'.format(
+                                 tuple(shape), self.frames_path, self.shape))
+        self.shape = tuple(shape)
+        self.frames_file = open(self.frames_path, 'ab')
+        self.index_file = open(self.index_path, 'ab')
+        if new_archive:
+            header = struct.pack(HEADER_FORMAT, MAGIC, height, width, channels)
+            self.frames_file.write(header.ljust(HEADER_SIZE, b'\0'))
+        else:  # truncate any partial frame left by an unclean shutdown
+            stride = height * width * channels
+            self.frames_file.truncate(HEADER_SIZE + self.frame_count * stride)
+            self.index_file.truncate(self.frame_count * 8)
+
+    def write(self, image, timestamp):
+        """ Append one frame and its capture timestamp to the archive
+
+        Parameters:
+            image (OpenCV image): frame to append; uint8 of the archive shape
+            timestamp (float): capture time in seconds since the epoch
+        """
+        if self.max_frames is not None and self.frame_count >= self.max_frames:
+            if self.frames_file:
+                logging.info('Recording to %s stopped at max of %d frames',
+                             self.frames_path, self.max_frames)
+                self.close()
+            return
+        if self.frames_file is None:
+            self.open(image.shape)
+        if image.shape != self.shape:
+            if not self.shape_warned:
+                logging.warning('Frames of shape %s are not recorded to %s of '
+                                'shape %s', image.shape, self.frames_path,
+                                self.shape)
+                self.shape_warned = True
+            return
+        self.frames_file.write(np.ascontiguousarray(image, dtype=np.uint8).data)
+        self.index_file.write(struct.pack('<d', timestamp))
+        self.frame_count += 1
+
+    def close(self):
+        for f in (self.frames_file, self.index_file):
+            if f:
+                f.close()
+        self.frames_file = None
+        self.index_file = None
+
+
+class FrameArchive:
+    """ Reads a frame archive as a zero copy memory mapped array of frames
+
+    The frames are memory mapped copy-on-write, so a frame can be drawn on
+    (e.g., by a detector draw_roi option) without changing the archive file.
+    Indexing returns a frame view; no frame data is read until it is used.
+
+    Parameters:
+        path (str): archive path, with or without the '.frames' extension
+    """
+
+    def __init__(self, path):
+        self.frames_path, self.index_path = archive_paths(path)
+        with open(self.frames_path, 'rb') as f:
+            header = f.read(struct.calcsize(HEADER_FORMAT))
+        magic, height, width, channels = struct.unpack(HEADER_FORMAT, header)
+        if magic != MAGIC:
+            raise ValueError('Not a frame archive: ' + self.frames_path)
+        if channels == 1:
+            self.shape = (height, width)
+        else:
+            self.shape = (height, width, channels)
+        stride = height * width * channels
+        self.timestamps = np.fromfile(self.index_path, dtype='<f8')
+        data_size = os.path.getsize(self.frames_path) - HEADER_SIZE
+        # an unclean shutdown can leave the files with unequal frame counts
+        count = min(len(self.timestamps), data_size // stride)
+        self.timestamps = self.timestamps[:count]
+        if count:
+            self.frames = np.memmap(self.frames_path, dtype=np.uint8, mode='c',
+                                    offset=HEADER_SIZE,
+                                    shape=(count,) + self.shape)
+        else:
+            self.frames = np.zeros((0,) + self.shape, dtype=np.uint8)
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def __getitem__(self, i):
+        return self.frames[i]
+
+    def close(self):
+        self.frames = None
@@ -0,0 +1,178 @@
+"""framecache: intermediate images of a frame, shared by a camera's detectors
+
+A camera can have several detectors, often with overlapping ROIs. Each one
+converts its ROI to grayscale, and each motion detector blurs it. A FrameCache
+is created for each frame. It computes each intermediate image that the
+detectors ask for once, over the union of the ROIs of the detectors that use
+it, and each detector gets its ROI of it. The FrameCache, and its images, are
+released when all the detectors have run on the frame.
+
+The union of ROIs far apart, e.g., in opposite corners, is nearly the whole
+frame. So when the union box holds more pixels than the ROIs themselves, each
+ROI gets its own intermediate images instead (see grouped_boxes()).
+
+Blurring the union box, rather than each ROI by itself, changes the blurred
+pixels near the edges of an ROI: the blur sees the pixels just outside the ROI
+instead of the ROI's own pixels reflected at its border. Away from the edges,
+within half the blur_kernel_size, the blurred pixels are the same.
+
+Copyright (c) 2017 by Jeff Bass.
+License: MIT, see LICENSE for more details.
+"""
+
+import cv2
+import numpy as np
+
+
+def union_box(boxes):
+    """ Return the (x1, y1, x2, y2) box that holds all of the boxes
+    """
+    return (min(box[0] for box in boxes), min(box[1] for box in boxes),
+            max(box[2] for box in boxes), max(box[3] for box in boxes))
+
+
+def box_area(box):
+    return (box[2] - box[0]) * (box[3] - box[1])
+
+
+def grouped_boxes(rois):
+    """ Return the boxes to compute an intermediate image of the rois over
+
+    The union of the rois, if it holds no more pixels than the rois do
+    together; otherwise each roi by itself.
+
+    Parameters:
+        rois (list): (x1, y1, x2, y2) ROIs of the detectors using the image
+    """
+    rois = list(dict.fromkeys(rois))  # detectors with the same ROI share it
+    union = union_box(rois)
+    if box_area(union) <= sum(box_area(roi) for roi in rois):
+        return [union]
+    return rois
+
+
+def containing_box(boxes, box):
+    """ Return the first of boxes that holds box, or None
+    """
+    for outer in boxes:
+        if (outer[0] <= box[0] and outer[1] <= box[1]
+                and box[2] <= outer[2] and box[3] <= outer[3]):
+            return outer
+    return None
+
+
+def frame_boxes(detectors):
+    """ Return the boxes each FrameCache intermediate image is computed over
+
+    Called once, after the detector ROIs have been converted to pixels.
+
+    Parameters:
+        detectors (list): the Detector objects of a camera
+
+    Returns:
+        boxes (dict): intermediate image key -> list of (x1, y1, x2, y2)
+            boxes from grouped_boxes() of the ROIs of the detectors that use
+            that image
+    """
+    rois = [detector.detect_top_left + detector.detect_bottom_right
+            for detector in detectors]
+    boxes = {}
+    if not rois:
+        return boxes
+    boxes['gray'] = grouped_boxes(rois)
+    kernels = {}
+    for detector, roi in zip(detectors, rois):
+        if detector.detector_type == 'motion':
+            kernels.setdefault(detector.blur_kernel_size, []).append(roi)
+    for kernel_size, kernel_rois in kernels.items():
+        boxes[('blur', kernel_size)] = grouped_boxes(kernel_rois)
+    light_rois = [roi for detector, roi in zip(detectors, rois)
+                  if detector.detector_type == 'light']
+    light_boxes = grouped_boxes(light_rois) if light_rois else []
+    # an integral image only helps with several ROIs in one box
+    if len(light_rois) > 1 and len(light_boxes) == 1:
+        boxes['integral'] = light_boxes
+    return boxes
+
+
+class FrameCache:
+    """ Intermediate images of one frame, each computed once when first used
+
+    Parameters:
+        image (OpenCV image or LazyFrame): the frame at detection resolution
+        boxes (dict): box of each intermediate image, from frame_boxes()
+    """
+
+    def __init__(self, image, boxes):
+        self.image = image
+        self.boxes = boxes
+        self.cache = {}
+
+    def region(self, key, box):
+        """ Return the intermediate image key over box, one of its boxes
+        """
+        if (key, box) not in self.cache:
+            if key == 'gray':
+                x1, y1, x2, y2 = box
+                image = cv2.cvtColor(self.image[y1:y2, x1:x2],
+                                     cv2.COLOR_BGR2GRAY)
+            elif key == 'integral':
+                image = cv2.integral(self.crop('gray', box))
+            else:  # ('blur', kernel_size)
+                kernel_size = key[1]
+                image = cv2.GaussianBlur(self.crop('gray', box),
+                                         (kernel_size, kernel_size), 0)
+            self.cache[(key, box)] = image
+        return self.cache[(key, box)]
+
+    def crop(self, key, box):
+        """ Return the box part of intermediate image key
+
+        A gray box that is in none of the gray boxes, e.g., the union of the
+        ROIs of two motion detectors when each ROI has its own gray image, is
+        converted to grayscale by itself, without caching it.
+
+        Parameters:
+            key: intermediate image key, e.g., 'gray'
+            box (tuple): (x1, y1, x2, y2) in detection resolution pixels
+        """
+        outer = containing_box(self.boxes[key], box)
+        if outer is None:  # only for 'gray'
+            x1, y1, x2, y2 = box
+            return cv2.cvtColor(self.image[y1:y2, x1:x2], cv2.COLOR_BGR2GRAY)
+        image = self.region(key, outer)
+        left, top = outer[:2]
+        x1, y1, x2, y2 = box
+        return image[y1 - top:y2 - top, x1 - left:x2 - left]
+
+    def gray(self, top_left, bottom_right):
+        """ Return the grayscale ROI
+        """
+        return self.crop('gray', top_left + bottom_right)
+
+    def blurred(self, top_left, bottom_right, kernel_size):
+        """ Return the grayscale ROI after a GaussianBlur of kernel_size
+        """
+        return self.crop(('blur', kernel_size), top_left + bottom_right)
+
+    def mean(self, top_left, bottom_right):
+        """ Return the mean pixel value of the grayscale ROI
+
+        With several light detectors whose ROIs share one box, the mean of
+        each ROI is computed from an integral image in constant time instead
+        of summing the ROI.
+        """
+        box = containing_box(self.boxes.get('integral', ()),
+                             top_left + bottom_right)
+        if box is None:
+            return np.mean(self.gray(top_left, bottom_right))
+        integral = self.region('integral', box)
+        left, top = box[:2]
+        x1, y1 = top_left[0] - left, top_left[1] - top
+        x2, y2 = bottom_right[0] - left, bottom_right[1] - top
+        area = (x2 - x1) * (y2 - y1)
+        if area == 0:
+            return 0.0
+        total = (integral[y2, x2] - integral[y1, x2]
+                 - integral[y2, x1] + integral[y1, x1])
+        return total / area
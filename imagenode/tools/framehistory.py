@@ -0,0 +1,238 @@
+"""framehistory: a cam_q that keeps its frames compressed or downscaled
+
+The cam_q of each camera keeps its most recent frames, so that a detector can
+send the frames from just before an event. Most of them are never sent, but
+as full size images they use a lot of memory: 50 frames of 640x480 are 46 MB.
+A FrameHistory can keep each frame as a jpg, or as a downscaled copy, which
+is a small fraction of that size, and can be limited to a number of bytes
+instead of a number of frames. So a camera can keep several seconds of frames
+from before an event on a Raspberry Pi with little memory.
+
+Frames are compressed or downscaled by a thread of the FrameHistory, not by
+the thread that reads the camera. The newest frame is kept as it is until the
+next frame is appended, since the detectors are still using it and may draw
+on it (draw_roi and draw_time). At most MAX_PENDING frames wait for the
+thread; if it falls further behind, e.g., when jpg compression is slower than
+the camera, the next frame is stored by the thread that appends it instead,
+which slows down reading the camera rather than letting frames pile up.
+
+The memory limit counts stored frames: the jpgs or downscaled copies, or the
+frames themselves when they are kept as images. Frames not stored yet, the
+newest one and up to MAX_PENDING waiting for the thread, are not counted, so
+a burst of frames doesn't evict the stored frames that came before it.
+
+Copyright (c) 2017 by Jeff Bass.
+License: MIT, see LICENSE for more details.
+"""
+
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+from tools.lazyframe import LazyFrame, as_image
+from tools.queues import OverflowDeque
+
+CAM_Q_STORES = ('image', 'jpg', 'downscale')
+MAX_PENDING = 2  # most frames waiting to be stored by the FrameHistory thread
+
+
+def frame_nbytes(frame):
+    """ Return the bytes of memory used by a frame in a cam_q
+
+    Parameters:
+        frame (OpenCV image or LazyFrame): a frame
+    """
+    if isinstance(frame, LazyFrame):
+        nbytes = frame.raw.nbytes
+        if frame.transformed is not None:
+            nbytes += frame.transformed.nbytes
+        return nbytes
+    return frame.nbytes
+
+
+class StoredFrame:
+    """ A frame that is compressed as a jpg or downscaled after it is stored
+
+    Until it is stored, it holds the frame itself. Like a LazyFrame, it has the
+    shape of the frame, image() returns the whole image and slicing it, e.g.,
+    frame[y1:y2, x1:x2], returns an ROI in the coordinates of the frame.
+
+    Parameters:
+        frame (OpenCV image or LazyFrame): the frame to store
+        history (FrameHistory): the FrameHistory it is stored in
+    """
+
+    def __init__(self, frame, history):
+        self.frame = frame
+        self.history = history
+        self.shape = frame.shape
+        self.stored = None  # jpg_buffer or downscaled image
+        self.forgotten = False  # dropped from the FrameHistory
+
+    def store(self):
+        """ Compress or downscale the frame and count its bytes as stored
+        """
+        if self.forgotten:  # dropped before it was stored; not worth storing
+            return
+        image = as_image(self.frame)
+        if self.history.store == 'jpg':
+            self.stored = cv2.imencode('.jpg', image,
+                                       [int(cv2.IMWRITE_JPEG_QUALITY),
+                                        self.history.quality])[1]
+        else:
+            height, width = image.shape[:2]
+            size = (max(1, width * self.history.scale // 100),
+                    max(1, height * self.history.scale // 100))
+            self.stored = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+        self.frame = None  # release the frame once it is stored
+        self.history.count(self, self.stored.nbytes)
+
+    def image(self):
+        """ Return the image of the frame; a downscaled frame stays downscaled
+
+        A decoded jpg is added to the jpg EncodeCache with its jpg_buffer, so
+        sending it costs no second compression.
+        """
+        frame = self.frame
+        if frame is not None:  # not stored yet
+            return as_image(frame)
+        if self.history.store == 'downscale':
+            return self.stored
+        image = cv2.imdecode(self.stored, cv2.IMREAD_UNCHANGED)
+        if self.history.jpg_cache is not None:
+            self.history.jpg_cache.put(image, self.history.quality,
+                                       self.stored)
+        return image
+
+    def __getitem__(self, key):
+        """ Return the ROI frame[rows, columns], in the frame's coordinates
+
+        Only a (rows slice, columns slice) key is supported. The ROI of a
+        downscaled frame is cut from the downscaled image, so it is smaller.
+        """
+        frame = self.frame
+        if frame is not None:
+            return frame[key]
+        if self.history.store == 'jpg':
+            return self.image()[key]
+        rows, columns = key
+        height, width = self.shape[:2]
+        y1, y2, _ = rows.indices(height)
+        x1, x2, _ = columns.indices(width)
+        scale = self.history.scale
+        return self.stored[y1 * scale // 100:y2 * scale // 100,
+                           x1 * scale // 100:x2 * scale // 100]
+
+
+class FrameHistory(OverflowDeque):
+    """ A cam_q that keeps frames as jpgs or downscaled and limits their bytes
+
+    Has the same methods as OverflowDeque, and the same overflow policies
+    when it has maxlen frames. If max_bytes is set, the oldest frames are also
+    dropped while the stored frames use more than max_bytes of memory; the
+    newest frame is always kept. The bytes are kept as a running total.
+
+    Parameters:
+        maxlen (int): maximum number of frames, or None for no limit
+        overflow (str): overflow policy, one of CAM_Q_OVERFLOW_POLICIES
+        decimate (int): N for the 'decimate' overflow policy
+        store (str): how frames are kept, one of CAM_Q_STORES
+        max_bytes (int): maximum bytes of memory used by the stored frames,
+            or None
+        quality (int): jpg quality when store is 'jpg'
+        scale (int): percent of the frame width and height when store is
+            'downscale'
+    """
+
+    def __init__(self, maxlen=50, overflow='drop_oldest', decimate=2,
+                 store='image', max_bytes=None, quality=95, scale=50):
+        super().__init__(maxlen=maxlen or sys.maxsize, overflow=overflow,
+                         decimate=decimate)
+        self.store = store
+        self.max_bytes = max_bytes
+        self.quality = quality
+        self.scale = scale
+        self.jpg_cache = None  # EncodeCache set by the ImageNode
+        self.executor = None
+        if store != 'image':
+            self.executor = ThreadPoolExecutor(max_workers=1)
+        self.newest = None  # StoredFrame not stored yet
+        self.lock = threading.Lock()
+        self.pending = 0  # frames waiting to be stored by the thread
+        self.stored_inline = 0  # frames stored by the appending thread
+        self.counted = {}  # id(frame) -> bytes counted for the frame
+        self.stored_bytes = 0  # running total of the counted bytes
+
+    def append(self, frame):
+        if self.executor is not None:
+            if self.newest is not None:
+                self.store_frame(self.newest)  # its detectors are done with it
+                self.newest = None
+            frame = StoredFrame(frame, self)
+        oldest = self.q[0] if len(self.q) >= self.maxlen else None
+        if not super().append(frame):
+            return False  # dropped by the overflow policy
+        if oldest is not None:  # the deque dropped its oldest frame
+            self.forget(oldest)
+        if self.executor is not None:
+            self.newest = frame
+        else:
+            self.count(frame, frame_nbytes(frame))
+        if self.max_bytes:
+            while len(self.q) > 1 and self.stored_bytes > self.max_bytes:
+                self.forget(self.q.popleft())
+                self.dropped += 1
+        return True
+
+    def store_frame(self, frame):
+        """ Store a StoredFrame in the thread, or here if the thread is behind
+        """
+        with self.lock:
+            behind = self.pending >= MAX_PENDING
+            if not behind:
+                self.pending += 1
+        if behind:
+            self.stored_inline += 1
+            frame.store()
+        else:
+            self.executor.submit(self.store_pending, frame)
+
+    def store_pending(self, frame):
+        try:
+            frame.store()
+        finally:
+            with self.lock:
+                self.pending -= 1
+
+    def count(self, frame, nbytes):
+        """ Add the bytes of a stored frame to the running total
+        """
+        with self.lock:
+            if not getattr(frame, 'forgotten', False):
+                self.counted[id(frame)] = nbytes
+                self.stored_bytes += nbytes
+
+    def forget(self, frame):
+        """ Subtract the bytes of a frame dropped from the running total
+        """
+        with self.lock:
+            if isinstance(frame, StoredFrame):
+                frame.forgotten = True
+            self.stored_bytes -= self.counted.pop(id(frame), 0)
+
+    def nbytes(self):
+        """ Return the bytes of memory used by the stored frames
+        """
+        return self.stored_bytes
+
+    def clear(self):
+        for frame in self.q:
+            self.forget(frame)
+        super().clear()
+        self.newest = None
+
+    def stats_text(self):
+        """ Return the counts and bytes used as text, e.g. for a heartbeat
+        """
+        return '{} bytes={} stored_inline={}'.format(
+            super().stats_text(), self.stored_bytes, self.stored_inline)
@@ -0,0 +1,230 @@
+"""framering: shared memory frame ring and send queue for camera processes
+
+When the camera_processes option is True, the main imagenode process only
+captures frames. Each camera's detectors run in a separate process and images
+are sent to the imagehub from another separate process, so that capture,
+detection, jpg compression and sending can each use a different RPi core.
+
+Frames are never pickled between these processes. The main process copies
+each captured frame into the next slot of a FrameRing, which is a block of
+preallocated frame slots in multiprocessing.shared_memory. Only the small
+(slot, sequence number) pair is passed to the other processes. Each slot has a
+sequence number in shared memory, so a process can check that a slot still
+holds the frame it was told about before using it; frames that have been
+overwritten because a process fell behind are dropped instead of being used.
+
+Copyright (c) 2017 by Jeff Bass.
+License: MIT, see LICENSE for more details.
+"""
+
+import queue
+import multiprocessing
+from collections import namedtuple, OrderedDict
+from multiprocessing import shared_memory
+import numpy as np
+from tools.queues import QueueStats, CONTINUOUS
+
+# a reference to a frame in camera number 'camera' FrameRing slot 'slot'
+FrameRef = namedtuple('FrameRef', 'camera slot seq')
+# a reference to a constant placeholder image, by its index in a list of them
+ConstantRef = namedtuple('ConstantRef', 'index')
+
+
+class FrameRing:
+    """ A ring of preallocated frame slots in shared memory
+
+    Created by the main process before the camera processes are started; the
+    camera processes inherit it. Only the main process writes frames.
+
+    Parameters:
+        shape (tuple): shape of every frame, e.g. (480, 640, 3)
+        slots (int): number of frame slots in the ring
+    """
+
+    def __init__(self, shape, slots):
+        self.shape = tuple(shape)
+        self.slots = slots
+        frame_bytes = int(np.prod(self.shape))
+        self.frames_shm = shared_memory.SharedMemory(
+            create=True, size=frame_bytes * slots)
+        self.seqs_shm = shared_memory.SharedMemory(create=True, size=8 * slots)
+        self.frames = np.ndarray((slots,) + self.shape, dtype=np.uint8,
+                                 buffer=self.frames_shm.buf)
+        self.seqs = np.ndarray((slots,), dtype=np.int64,
+                               buffer=self.seqs_shm.buf)
+        self.seqs[:] = -1  # -1 marks a slot that holds no valid frame
+        self.seq = 0
+        self.next_slot = 0
+
+    def write(self, image):
+        """ Copy image into the next slot, overwriting the oldest frame
+
+        Parameters:
+            image (OpenCV image): frame of the ring frame shape
+
+        Returns:
+            (slot, seq) of the frame written
+        """
+        slot = self.next_slot
+        self.next_slot = (slot + 1) % self.slots
+        self.seqs[slot] = -1  # slot is invalid while it is being written
+        np.copyto(self.frames[slot], image)
+        self.seq += 1
+        self.seqs[slot] = self.seq
+        return slot, self.seq
+
+    def is_current(self, slot, seq):
+        """ True if slot still holds frame seq (it has not been overwritten)
+        """
+        return self.seqs[slot] == seq
+
+    def view(self, slot):
+        """ Return a new zero copy array view of a frame slot
+        """
+        return self.frames[slot][...]
+
+    def copy(self, slot, seq):
+        """ Return a private copy of frame seq, or None if it was overwritten
+        """
+        image = self.frames[slot].copy()
+        if not self.is_current(slot, seq):  # overwritten during the copy
+            return None
+        return image
+
+    def close(self):
+        self.frames = None
+        self.seqs = None
+        self.frames_shm.close()
+        self.seqs_shm.close()
+
+    def unlink(self):
+        """ Free the shared memory; called once by the main process at exit
+        """
+        self.frames_shm.unlink()
+        self.seqs_shm.unlink()
+
+
+class StaleFrame(Exception):
+    """ A FrameRing slot was overwritten before a frame was read from it
+    """
+
+
+class RingFrame:
+    """ A frame in a FrameRing slot, as kept in a detector process's cam_q
+
+    A detector process that falls behind can keep a frame in its cam_q after
+    the main process has overwritten its slot with a newer frame. So a
+    RingFrame is only read with a check that its slot still holds it: image()
+    returns the zero copy view, which the sender process checks again before
+    sending it, and slicing it, e.g., frame[y1:y2, x1:x2], returns a private
+    copy of the slice. Either raises StaleFrame if the slot was overwritten.
+
+    Parameters:
+        ring (FrameRing): the ring that holds the frame
+        slot (int): slot of the frame
+        seq (int): seq of the frame
+        view (OpenCV image): zero copy view of the slot
+    """
+
+    def __init__(self, ring, slot, seq, view):
+        self.ring = ring
+        self.slot = slot
+        self.seq = seq
+        self.view = view
+        self.shape = view.shape
+
+    def is_current(self):
+        return self.ring.is_current(self.slot, self.seq)
+
+    def image(self):
+        if not self.is_current():
+            raise StaleFrame
+        return self.view
+
+    def __getitem__(self, key):
+        crop = self.view[key].copy()
+        if not self.is_current():  # overwritten before or during the copy
+            raise StaleFrame
+        return crop
+
+
+class ProcessSendQueue(QueueStats):
+    """ Implements a send_q replacement that sends from a separate process
+
+    A drop-in replacement for send_q, like SendQueue, that always tests as
+    empty so that the imagenode.py main() event loop only reads cameras. The
+    (text, image) tuples appended to it are put into a multiprocessing.Queue
+    that is emptied by the sender process. Any image that is a registered view
+    of a FrameRing slot is replaced by a FrameRef, so that only the slot
+    number, not the image, is passed to the sender process. Any image that is
+    a registered constant placeholder image, such as the tiny event message
+    images, is replaced by a ConstantRef. Other images are pickled.
+
+    The priority class of each message is put into the multiprocessing.Queue
+    with it, so the sender process can send messages in priority order. If the
+    multiprocessing.Queue is full, the appended message is dropped. The
+    enqueued and dropped counts are of the messages appended in this process.
+
+    Parameters:
+        maxlen (int): maximum number of (text, image) tuples waiting to be sent
+        max_refs (int): number of registered FrameRing views to remember
+    """
+
+    def __init__(self, maxlen=500, max_refs=500):
+        super().__init__()
+        self.q = multiprocessing.Queue(maxsize=maxlen)
+        self.max_refs = max_refs
+        self.refs = OrderedDict()  # id(view) -> (view, FrameRef)
+        self.constants = {}  # id(image) -> (image, ConstantRef)
+
+    def __bool__(self):
+        return False  # so that the read loop keeps reading forever
+
+    def __len__(self):
+        return 0  # so that the main() send loop is never entered
+
+    def register(self, view, ref):
+        """ Remember that array view is the frame referred to by FrameRef ref
+
+        The view itself is kept in self.refs so its id() can't be reused while
+        it is registered.
+        """
+        self.refs[id(view)] = (view, ref)
+        if len(self.refs) > self.max_refs:
+            self.refs.popitem(last=False)
+
+    def register_constant(self, image, ref):
+        """ Remember that image is the constant image referred to by ref
+
+        Constant images are never forgotten. They must be registered before
+        the camera processes are started, so that every process has them.
+        """
+        self.constants[id(image)] = (image, ref)
+
+    def append(self, text_and_image, priority=CONTINUOUS):
+        text, image = text_and_image
+        registered = self.refs.get(id(image)) or self.constants.get(id(image))
+        if registered and registered[0] is image:
+            image = registered[1]
+        try:
+            self.q.put_nowait((text, image, priority))
+            self.enqueued += 1
+        except queue.Full:
+            self.dropped += 1
+
+    def get(self, block=True):
+        """ Return the next (text, image, priority) message
+
+        Returns None if block is False and there is no message waiting, or
+        'stop' if stop_sending() has been called.
+        """
+        try:
+            return self.q.get(block=block)
+        except queue.Empty:
+            return None
+
+    def stop_sending(self):
+        try:
+            self.q.put_nowait('stop')  # tells the sender process to stop
+        except queue.Full:
+            pass  # the sender process will be terminated instead
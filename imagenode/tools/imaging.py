@@ -12,21 +12,35 @@ import pprint
 import signal
 import logging
 import itertools
+import queue
 import threading
 import multiprocessing
-from time import sleep
+from concurrent.futures import ThreadPoolExecutor
+from time import sleep, perf_counter, time
 from datetime import datetime
 from ast import literal_eval
-from collections import deque
+from collections import deque, OrderedDict
 import numpy as np
 import cv2
 import imutils
-from imutils.video import VideoStream
 import zmq  # needed to use zmq.LINGER in ImageNode.closall methods
 import imagezmq
 from tools.utils import interval_timer
 from tools.nodehealth import HealthMonitor
 from tools.utils import versionCompare
+from tools.framearchive import FrameArchive, FrameArchiveWriter, is_frame_archive
+from tools.framering import FrameRing, FrameRef, ConstantRef, ProcessSendQueue
+from tools.framering import RingFrame, StaleFrame
+from tools.encodecache import EncodeCache
+from tools.lazyframe import LazyFrame, as_image
+from tools.framehistory import FrameHistory, CAM_Q_STORES
+from tools.bufferpool import BufferPool
+from tools.framecache import FrameCache, frame_boxes
+from tools.background import background_model
+from tools.sendcontrol import QualityController, RateLimiter
+from tools.queues import PriorityDeque, OverflowDeque
+from tools.queues import OVERFLOW_POLICIES, CAM_Q_OVERFLOW_POLICIES
+from tools.queues import CONTROL, EVENT, SENSOR, EVENT_IMAGE, CONTINUOUS
 from pkg_resources import require
 
 
@@ -52,8 +66,19 @@ class ImageNode:
         ret_code, jpg_buffer = cv2.imencode(
             ".jpg", self.tiny_image, [int(cv2.IMWRITE_JPEG_QUALITY), 95])
         self.tiny_jpg = jpg_buffer  # matching tiny blank jpeg
-        self.jpeg_quality = 95
+        self.jpeg_quality = settings.jpeg_quality
         self.pid = os.getpid()  # get process ID of this program
+        # ratio of recent jpg sizes to image sizes; in shared memory so that
+        #  it is measured by the sender process with camera_processes
+        self.jpg_ratio = multiprocessing.Value('d', 0.1, lock=False)
+        if settings.send_type == 'image':
+            self.jpg_ratio.value = 1.0
+        # cache of jpg_buffers so that a frame sent more than once is only
+        #  compressed once; sized to hold every frame in every camera's cam_q
+        cam_count = len(settings.cameras) if settings.cameras else 1
+        self.jpg_cache = EncodeCache(encode=self.compress_jpg,
+                                     maxlen=settings.queuemax * cam_count,
+                                     jpg_ratio=self.jpg_ratio)
 
         # open ZMQ link to imagehub
         self.sender = imagezmq.ImageSender(connect_to=settings.hub_address)
@@ -62,7 +87,10 @@ class ImageNode:
         # If settings.REP_watcher is True, pick the send_frame function
         #  that does time recording of each REQ and REP. Start REP_watcher
         #  thread. Set up deques to track REQ and REP times.
+        # For jpg, also pick the send_encoded function that sends an already
+        #  compressed jpg_buffer, for use with the encode_threads option.
         self.patience = settings.patience  # how long to wait in seconds
+        self.send_encoded = None
         if settings.send_type == 'image':  # set send function to image
             if settings.REP_watcher:
                 self.send_frame = self.send_image_frame_REP_watcher
@@ -71,21 +99,40 @@ class ImageNode:
         else: # anything not spelled 'image' sets send function to jpg
             if settings.REP_watcher:
                 self.send_frame = self.send_jpg_frame_REP_watcher
+                self.send_encoded = self.send_jpg_buffer_REP_watcher
             else:
                 self.send_frame = self.send_jpg_frame
+                self.send_encoded = self.send_jpg_buffer
+        # if there is a bandwidth budget, adjust jpeg_quality to stay within it
+        self.jpeg_control = None
+        if settings.send_bandwidth or settings.send_frame_ms:
+            self.jpeg_control = QualityController(
+                max_bytes_per_sec=settings.send_bandwidth,
+                max_ms_per_frame=settings.send_frame_ms,
+                min_quality=settings.jpeg_quality_min,
+                max_quality=settings.jpeg_quality)
         if settings.REP_watcher:  # set up deques & start thread to watch for REP
             threading.Thread(daemon=True, target=self.REP_watcher).start()
             self.REQ_sent_time = deque(maxlen=1)
             self.REP_recd_time = deque(maxlen=1)
 
         # set up message queue to hold (text, image) messages to be sent to hub
-        if settings.send_threading:  # use a threaded send_q sender instead
-            self.send_q = SendQueue(maxlen=settings.queuemax,
-                                    send_frame=self.send_frame,
-                                    process_hub_reply=self.process_hub_reply)
+        # camera_threading & encode_threads require the threaded send_q sender
+        # messages are sent in priority class order if send_priority is True
+        if settings.camera_processes:  # send_q is emptied by a sender process
+            self.send_q = ProcessSendQueue(maxlen=settings.queuemax,
+                                           max_refs=settings.ring_slots)
+        elif (settings.send_threading or settings.camera_threading
+              or settings.encode_threads):
+            self.send_q = self.threaded_send_q(settings)
             self.send_q.start()
         else:
-            self.send_q = deque(maxlen=settings.queuemax)
+            self.send_q = PriorityDeque(maxlen=settings.queuemax,
+                                        capacities=settings.send_q_capacities,
+                                        use_priority=settings.send_priority,
+                                        overflow=settings.send_q_overflow,
+                                        timeout=settings.send_q_timeout,
+                                        decimate=settings.send_q_decimate)
 
         # start system health monitoring & get system type (RPi vs Mac etc)
         self.health = HealthMonitor(settings, self.send_q)
@@ -107,12 +154,31 @@ class ImageNode:
         self.camlist = []  # need an empty list if there are no cameras
         if settings.cameras:  # is there at least one camera in yaml file
             self.setup_cameras(settings)
+        self.frame_scheduler = FrameScheduler(self.camlist)
+        for camera in self.camlist:
+            if isinstance(camera.cam_q, FrameHistory):
+                camera.cam_q.jpg_cache = self.jpg_cache  # decoded jpgs are cached
+        self.setup_rate_limiters(settings)
+        if settings.heartbeat_stats:  # add queue counts to heartbeat messages
+            self.health.stats_queues.append(('send_q', self.send_q))
+            if self.send_encoded:
+                self.health.stats_queues.append(('jpg_cache', self.jpg_cache))
+            if self.send_encoded and self.jpeg_control:
+                self.health.stats_queues.append(('jpg', self.jpeg_control))
+            self.health.stats_queues.extend(self.rate_limiters)
+            for camera in self.camlist:
+                name = camera.viewname.strip() or camera.cam_type
+                self.health.stats_queues.append((name + ' cam_q', camera.cam_q))
+                self.health.stats_queues.append((name + ' frame_pool',
+                                                 camera.frame_pool))
 
         # Read a test image from each camera to check and verify:
         # 1. test that all cameras can successfully read an image
         # 2. determine actual camera resolution from returned image size
         # 3. if resize_width has been set, test that it works without error
         # 4. for each detector, convert roi_pct to roi_pixels
+        # 5. if detect_resize_width has been set, compute detection resolution
+        #    and convert roi_pct to pixels of the detection resolution too
         # Note that image size returned from reading the camera can vary from
         # requested resolution size, especially in webcams
         for camera in self.camlist:
@@ -128,6 +194,13 @@ class ImageNode:
             else:
                 camera.width_pixels = width
             camera.res_resized = (width, height)
+            camera.frame_shape = image_size  # shape of each transformed frame
+            if camera.detect_resize_width:
+                detect_width = (width * camera.detect_resize_width) // 100
+                detect_height = (height * detect_width) // width
+            else:
+                detect_width, detect_height = width, height
+            camera.res_detect = (detect_width, detect_height)
             # compute ROI in pixels using roi_pct and current image size
             for detector in camera.detectors:
                 top_left_x = detector.roi_pct[0][0] * width // 100
@@ -137,6 +210,14 @@ class ImageNode:
                 detector.top_left = (top_left_x, top_left_y)
                 detector.bottom_right = (bottom_right_x, bottom_right_y)
                 detector.roi_pixels = (detector.top_left, detector.bottom_right)
+                # ROI in pixels of the detection resolution image
+                top_left_x = detector.roi_pct[0][0] * detect_width // 100
+                top_left_y = detector.roi_pct[0][1] * detect_height // 100
+                bottom_right_x = detector.roi_pct[1][0] * detect_width // 100
+                bottom_right_y = detector.roi_pct[1][1] * detect_height // 100
+                detector.detect_top_left = (top_left_x, top_left_y)
+                detector.detect_bottom_right = (bottom_right_x, bottom_right_y)
+                detector.detect_scale = width / detect_width
                 detector.roi_area = ((bottom_right_x - top_left_x)
                                      * (bottom_right_y - top_left_y))
                 if detector.detector_type == 'motion':
@@ -147,10 +228,38 @@ class ImageNode:
                     time_x = detector.draw_time_org[0] * width // 100
                     time_y = detector.draw_time_org[1] * height // 100
                     detector.draw_time_org = (time_x, time_y)
+            # areas of each frame that the detectors' FrameCache images cover
+            camera.frame_boxes = frame_boxes(camera.detectors)
 
         if settings.print_node:
             self.print_node_details(settings)
 
+        # register the constant placeholder images sent with text messages, so
+        #  that their jpgs are compressed only once, at startup
+        self.constant_images = [self.tiny_image, self.health.tiny_image]
+        for camera in self.camlist:
+            for detector in camera.detectors:
+                self.constant_images.append(detector.msg_image)
+        self.register_constant_images(settings)
+
+        # if camera_processes, start detector processes and a sender process
+        self.camera_processes = []
+        if settings.camera_processes:
+            self.start_camera_processes(settings)
+
+        # if camera_threading, start a capture & detect thread for each camera
+        self.camera_threads = []
+        if settings.camera_threading and self.camlist and not self.camera_processes:
+            self.keep_reading = True
+            self.cameras_stopped = threading.Event()
+            for camera in self.camlist:
+                t = threading.Thread(daemon=True, target=self.camera_worker,
+                                     args=(camera,))
+                self.camera_threads.append(t)
+            for t in self.camera_threads:
+                t.start()
+            self.read_cameras = self.watch_camera_threads
+
         # send an imagenode startup event message with system values
         text = '|'.join([settings.nodename,
                         'Restart',
@@ -160,7 +269,7 @@ class ImageNode:
                         self.health.ram_size,
                         self.health.time_since_restart])
         text_and_image = (text, self.tiny_image)
-        self.send_q.append(text_and_image)
+        self.send_q.append(text_and_image, CONTROL)
 
     def print_node_details(self, settings):
         print('Node details after setup and camera test read:')
@@ -172,6 +281,15 @@ class ImageNode:
             print('    Resolution actual after cam read:', cam.res_actual)
             print('    Resize_width setting:', cam.resize_width)
             print('    Resolution after resizing:', cam.res_resized)
+            if cam.detect_resize_width:
+                print('    Detect_resize_width setting:', cam.detect_resize_width)
+                print('    Resolution for detectors:', cam.res_detect)
+            if cam.cam_type == 'replay':
+                print('    Replay source:', cam.replay)
+                print('    Replay FPS:', cam.replay_fps, '(0 = as fast as possible)')
+                print('    Replay loop:', cam.replay_loop)
+            if cam.record:
+                print('    Recording to frame archive:', cam.record)
             if cam.cam_type == 'PiCamera':
                 # check picamera version
                 try:
@@ -208,10 +326,17 @@ class ImageNode:
                 print('    Detector:', detector.detector_type)
                 print('      ROI:', detector.roi_pct, '(in percents)')
                 print('      ROI:', detector.roi_pixels, '(in pixels)')
-                print('      ROI area:', detector.roi_area, '(in pixels)')
+                if cam.detect_resize_width:
+                    print('      ROI:', (detector.detect_top_left,
+                                         detector.detect_bottom_right),
+                          '(in detection pixels)')
+                print('      ROI area:', detector.roi_area, '(in detection pixels)')
                 print('      ROI name:', detector.roi_name)
                 print('      send_test_images:', detector.send_test_images)
                 print('      send_count:', detector.send_count)
+                if detector.idle_after is not None:
+                    print('      idle_after:', detector.idle_after, '(seconds)')
+                    print('      idle_every_nth:', detector.idle_every_nth)
                 if detector.detector_type == 'light':
                     print('      threshold:', detector.threshold)
                     print('      min_frames:', detector.min_frames)
@@ -222,6 +347,8 @@ class ImageNode:
                     print('      min_area:', detector.min_area, '(in percent)')
                     print('      min_area:', detector.min_area_pixels, '(in pixels)')
                     print('      blur_kernel_size:', detector.blur_kernel_size)
+                    print('      motion_scoring:', detector.motion_scoring)
+                    print('      background_model:', detector.background_model)
                     print('      print_still_frames:', detector.print_still_frames)
         print()
 
@@ -254,6 +381,76 @@ class ImageNode:
             lst = Light(light, settings.lights, settings)  # create a Light instance with settings
             self.lights.append(lst)  # add it to the list of lights
 
+    def register_constant_images(self, settings):
+        """ Add the images in self.constant_images to the jpg cache as constants
+
+        With camera_processes, they are also registered with the send_q, so
+        that they are passed to the sender process as a ConstantRef.
+
+        Parameters:
+            settings (Settings object): settings object created from YAML file
+        """
+        for index, image in enumerate(self.constant_images):
+            if image is self.tiny_image:
+                self.jpg_cache.add_constant(image, self.tiny_jpg)
+            else:
+                self.jpg_cache.add_constant(image)
+            if settings.camera_processes:
+                self.send_q.register_constant(image, ConstantRef(index))
+
+    def setup_rate_limiters(self, settings):
+        """ Create & chain the continuous send RateLimiters
+
+        The continuous_fps and continuous_bandwidth options can be set for the
+        node, for a camera and for a detector. Each detector that sends
+        continuously is limited by its own RateLimiter, if any, then by its
+        camera's, then by the node's. The continuous_every_nth option is
+        applied to each detector separately; a detector without the option
+        uses its camera's, or the node's. The RateLimiters are kept in
+        self.rate_limiters as (name, RateLimiter) for heartbeat_stats.
+
+        Parameters:
+            settings (Settings object): settings object created from YAML file
+        """
+        self.rate_limiters = []
+        node_limiter = self.rate_limiter('continuous', settings.continuous_fps,
+                                         settings.continuous_bandwidth)
+        for camera in self.camlist:
+            view = camera.viewname.strip() or camera.cam_type
+            camera_limiter = self.rate_limiter(view + ' continuous',
+                                               camera.continuous_fps,
+                                               camera.continuous_bandwidth,
+                                               parent=node_limiter)
+            for detector in camera.detectors:
+                every_nth = (detector.continuous_every_nth
+                             or camera.continuous_every_nth
+                             or settings.continuous_every_nth)
+                detector.continuous_limiter = self.rate_limiter(
+                    ' '.join([view, detector.detector_type, 'continuous']),
+                    detector.continuous_fps, detector.continuous_bandwidth,
+                    every_nth, parent=camera_limiter)
+
+    def rate_limiter(self, name, max_fps, max_bytes_per_sec, every_nth=1,
+                     parent=None):
+        """ Return a new RateLimiter, or parent if there are no limits to set
+
+        Parameters:
+            name (str): name of the RateLimiter in heartbeat_stats
+            max_fps (float): maximum images per second, or None
+            max_bytes_per_sec (int): maximum jpg bytes per second, or None
+            every_nth (int): send only every Nth image offered
+            parent (RateLimiter): the next RateLimiter in the chain, or None
+        """
+        if not (max_fps or max_bytes_per_sec or every_nth > 1):
+            return parent
+        limiter = RateLimiter(max_fps=max_fps,
+                              max_bytes_per_sec=max_bytes_per_sec,
+                              every_nth=every_nth)
+        limiter.parent = parent
+        limiter.jpg_ratio = self.jpg_ratio
+        self.rate_limiters.append((name, limiter))
+        return limiter
+
     def setup_cameras(self, settings):
         """ Create a list of cameras from the cameras section of the yaml file
 
@@ -301,18 +498,76 @@ class ImageNode:
                 # ... so continue to loop until there is a time in REQ_sent_time
                 pass
 
+    def threaded_send_q(self, settings):
+        """ Create a SendQueue that sends messages in a separate thread
+
+        Parameters:
+            settings (Settings object): settings object created from YAML file
+        """
+        return SendQueue(maxlen=settings.queuemax,
+                         send_frame=self.send_frame,
+                         process_hub_reply=self.process_hub_reply,
+                         capacities=settings.send_q_capacities,
+                         use_priority=settings.send_priority,
+                         overflow=settings.send_q_overflow,
+                         timeout=settings.send_q_timeout,
+                         decimate=settings.send_q_decimate,
+                         encode_frame=self.encode_jpg,
+                         send_encoded=self.send_encoded,
+                         encode_threads=settings.encode_threads)
+
+    def encode_jpg(self, image):
+        """ Returns the jpg_buffer of image, compressing it only once
+
+        A frame that is sent more than once, e.g., as a continuous image and
+        again in an event's cam_q images, is found in self.jpg_cache.
+        """
+
+        return self.jpg_cache.get(image, self.jpeg_quality)
+
+    def compress_jpg(self, image, quality):
+        """ Compresses image as jpg at quality and returns the jpg_buffer
+        """
+
+        ret_code, jpg_buffer = cv2.imencode(".jpg", image,
+                                            [int(cv2.IMWRITE_JPEG_QUALITY),
+                                             quality])
+        return jpg_buffer
+
     def send_jpg_frame(self, text, image):
         """ Compresses image as jpg before sending
 
         Function self.send_frame() is set to this function if jpg option chosen
         """
 
-        ret_code, jpg_buffer = cv2.imencode(".jpg", image,
-                                            [int(cv2.IMWRITE_JPEG_QUALITY),
-                                             self.jpeg_quality])
+        return self.send_jpg_buffer(text, self.encode_jpg(image))
+
+    def send_jpg_buffer(self, text, jpg_buffer):
+        """ Sends an image that has already been compressed as jpg
+
+        Function self.send_encoded() is set to this function if jpg option chosen
+        """
+
+        REQ_time = perf_counter()
         hub_reply = self.sender.send_jpg(text, jpg_buffer)
+        if self.jpeg_control:
+            self.control_jpeg_quality(jpg_buffer, perf_counter() - REQ_time)
         return hub_reply
 
+    def control_jpeg_quality(self, jpg_buffer, seconds):
+        """ Measures a sent jpg and sets the jpeg_quality of the next jpgs
+
+        Called only if there is a send_bandwidth or send_frame_ms budget. The
+        jpgs of text message placeholder images are not measured.
+
+        Parameters:
+            jpg_buffer (buffer): the jpg that was sent
+            seconds (float): time from sending the jpg to receiving the REP
+        """
+        if not self.jpg_cache.is_constant(jpg_buffer):
+            self.jpeg_quality = self.jpeg_control.update(len(jpg_buffer),
+                                                         seconds)
+
     def send_image_frame(self, text, image):
         """ Sends image as unchanged OpenCV image; no compression
 
@@ -334,16 +589,25 @@ class ImageNode:
         for details.
         """
 
-        ret_code, jpg_buffer = cv2.imencode(
-            ".jpg", image, [int(cv2.IMWRITE_JPEG_QUALITY),
-            self.jpeg_quality])
+        return self.send_jpg_buffer_REP_watcher(text, self.encode_jpg(image))
+
+    def send_jpg_buffer_REP_watcher(self, text, jpg_buffer):
+        """ Sends an already compressed jpg; sends with RPI_watcher deques
+
+        Function self.send_encoded() is set to this function if jpg option
+        chosen and if REP_watcher option is True. See send_jpg_frame_REP_watcher.
+        """
+
         self.REQ_sent_time.append(datetime.utcnow())  # utcnow 2x faster than now
+        REQ_time = perf_counter()
         try:
             hub_reply = self.sender.send_jpg(text, jpg_buffer)
         except:  # add more specific exception, e.g. ZMQError, after testing
             print("Exception at sender.send_jpg in REP_watcher function.")
             self. fix_comm_link()
         self.REP_recd_time.append(datetime.utcnow())
+        if self.jpeg_control:
+            self.control_jpeg_quality(jpg_buffer, perf_counter() - REQ_time)
         return hub_reply
 
     def send_image_frame_REP_watcher(self, text, image):
@@ -367,22 +631,282 @@ class ImageNode:
         return hub_reply
 
     def read_cameras(self):
-        """ Read one image from each camera and run detectors.
+        """ Read one new image from each ready camera and run detectors.
+
+        Waits until at least one camera has a new image, so the main loop
+        neither spins nor runs the detectors on the same image twice. Function
+        self.read_cameras() is replaced by watch_camera_threads() if the
+        camera_threading option is True, or by read_cameras_to_rings() if the
+        camera_processes option is True.
+        """
+        for camera in self.frame_scheduler.ready_cameras():
+            self.read_camera(camera)
+
+    def read_camera(self, camera):
+        """ Read one image from a camera and run its detectors.
+
+        Append transformed image to cam_q queue and run each detector on it.
+
+        Parameters:
+            camera (Camera object): camera to read
+        """
+        image = self.capture_frame(camera)
+        if image is None:
+            return  # duplicate frame
+        camera.cam_q_entry = (camera.cam_q[-1] if camera.cam_q.append(image)
+                              else None)
+        frame_cache = FrameCache(self.detect_frame(camera, image),
+                                 camera.frame_boxes)
+        for detector in camera.detectors:
+            self.run_detector(camera, image, detector, frame_cache)
+
+    def capture_frame(self, camera):
+        """ Read one image from a camera and transform it.
 
         Perform vflip and image resizing if requested in YAML setttings file.
-        Append transformed image to cam_q queue.
+        The transforms are done lazily: the image is returned as a LazyFrame
+        that only transforms the whole image if it is needed, e.g., to send
+        it; detectors only transform their ROI of it. If the camera record
+        option is set, append the transformed image to the camera's frame
+        archive.
+
+        Each camera stream numbers the frames it reads with frame_seq. If the
+        stream returns a frame that has already been read, it is counted as a
+        duplicate and None is returned, so no detector, cam_q or send_q sees
+        it twice.
+
+        Parameters:
+            camera (Camera object): camera to read
+
+        Returns:
+            image (OpenCV image or LazyFrame): the transformed image, or None
+        """
+        image = camera.cam.read()
+        if camera.cam.frame_seq == camera.frame_seq:
+            camera.duplicate_frames += 1
+            return None  # this frame has already been read
+        camera.frame_seq = camera.cam.frame_seq
+        capture_time = camera.cam.frame_time
+        if camera.vflip or camera.resize_width:
+            image = LazyFrame(image, vflip=camera.vflip,
+                              size=camera.res_resized, pool=camera.frame_pool)
+        if camera.recorder:
+            camera.recorder.write(as_image(image), capture_time)
+        return image
+
+    def detect_frame(self, camera, image):
+        """ Return the image the camera's detectors run on
+
+        If detect_resize_width has been set, this is a LazyFrame of image at the
+        detection resolution, so that detection costs less; the image that is
+        sent keeps its own resolution. Only the detector ROIs are resized.
+        Otherwise, it is image itself.
+
+        Parameters:
+            camera (Camera object): camera the image was read from
+            image (OpenCV image or LazyFrame): the transformed image
+
+        Returns:
+            detect_image (OpenCV image or LazyFrame): the image for detection
+        """
+        if not camera.detect_resize_width:
+            return image
+        if isinstance(image, LazyFrame):  # transform the raw image only once
+            return LazyFrame(image.raw, vflip=image.vflip, size=camera.res_detect)
+        return LazyFrame(image, size=camera.res_detect)
+
+    def start_camera_processes(self, settings):
+        """ Set up a FrameRing for each camera and start the camera processes
+
+        When the camera_processes option is True, the main process only reads
+        the cameras and writes each frame into the camera's FrameRing in
+        shared memory. Each camera's detectors run in a detector process and
+        the send_q is emptied by a sender process, so that capture, detection
+        and jpg compression & sending run on different cores. The processes
+        pass (slot, seq) frame references instead of pickled images.
+
+        Parameters:
+            settings (Settings object): settings object created from YAML file
+        """
+        for index, camera in enumerate(self.camlist):
+            camera.index = index
+            camera.ring = FrameRing(camera.frame_shape, settings.ring_slots)
+            camera.frame_q = multiprocessing.Queue(
+                maxsize=max(1, settings.ring_slots // 2))
+            camera.frames_dropped = 0
+            p = multiprocessing.Process(daemon=True, args=((camera,)),
+                                        target=self.detector_process)
+            self.camera_processes.append(p)
+        p = multiprocessing.Process(daemon=True, args=((settings,)),
+                                    target=self.sender_process)
+        self.camera_processes.append(p)
+        for p in self.camera_processes:
+            p.start()
+        self.read_cameras = self.read_cameras_to_rings
+
+    def read_cameras_to_rings(self):
+        """ Replaces read_cameras() in the main loop if camera_processes is True
+
+        Read one new image from each ready camera, write it into its FrameRing
+        and pass its (slot, seq) to the camera's detector process. If the
+        detector process has fallen behind, the frame is dropped.
+        """
+        for camera in self.frame_scheduler.ready_cameras():
+            image = self.capture_frame(camera)
+            if image is None:
+                continue  # duplicate frame
+            slot, seq = camera.ring.write(as_image(image))
+            try:
+                camera.frame_q.put_nowait((slot, seq))
+            except queue.Full:
+                camera.frames_dropped += 1
+
+    def detector_process(self, camera):
+        """ Run the detectors of one camera on frames from its FrameRing
+
+        Runs in a separate process for each camera when the camera_processes
+        option is True. The cam_q holds RingFrames, zero copy views of
+        FrameRing slots; it is kept shorter than the ring, but if this process
+        falls behind, the main process can still overwrite a slot whose frame
+        is in the cam_q. So an event's cam_q images are checked before they
+        are sent and an overwritten one is skipped (see RingFrame). Each view
+        is registered with the send_q so that sending it passes a FrameRef to
+        the sender process instead of the image.
+
+        Parameters:
+            camera (Camera object): camera whose detectors run in this process
+        """
+        camera.cam_q = OverflowDeque(maxlen=min(camera.cam_q.maxlen,
+                                                camera.ring.slots - 1),
+                                     overflow=camera.cam_q.overflow,
+                                     decimate=camera.cam_q.decimate)
+        try:
+            while True:
+                frame = camera.frame_q.get()
+                if frame is None:  # None means stop this process
+                    break
+                slot, seq = frame
+                if not camera.ring.is_current(slot, seq):
+                    continue  # this process fell behind; frame was overwritten
+                image = camera.ring.view(slot)
+                self.send_q.register(image, FrameRef(camera.index, slot, seq))
+                ring_frame = RingFrame(camera.ring, slot, seq, image)
+                camera.cam_q_entry = (ring_frame
+                                      if camera.cam_q.append(ring_frame)
+                                      else None)
+                frame_cache = FrameCache(self.detect_frame(camera, image),
+                                         camera.frame_boxes)
+                for detector in camera.detectors:
+                    self.run_detector(camera, image, detector, frame_cache)
+        except (KeyboardInterrupt, SystemExit):
+            pass
+        if camera.stale_frames:
+            logging.warning('Camera %s: %d event images were overwritten in '
+                            'the FrameRing before they were sent; increase '
+                            'ring_slots', camera.viewname, camera.stale_frames)
+
+    def sender_process(self, settings):
+        """ Send the (text, image) tuples from the send_q to the imagehub
+
+        Runs in a separate process when the camera_processes option is True.
+        ZMQ sockets can't be shared between processes, so this process opens
+        its own ZMQ link to the imagehub. A FrameRef is replaced by a copy of
+        the frame from the FrameRing, so that the frame can't be overwritten
+        while it is being compressed and sent; frames that have already been
+        overwritten are dropped. The copies of recent frames are kept, so that
+        a frame sent more than once is the same image each time and is only
+        compressed once (see EncodeCache). The messages are then sent by a SendQueue
+        thread in this process, so the send_priority, send_q_overflow and
+        encode_threads options work just as they do with send_threading.
+
+        Parameters:
+            settings (Settings object): settings object created from YAML file
+        """
+        self.sender = imagezmq.ImageSender(connect_to=settings.hub_address)
+        self.sender.zmq_socket.setsockopt(zmq.LINGER, 0)
+        if settings.REP_watcher:  # threads are not inherited; restart it
+            threading.Thread(daemon=True, target=self.REP_watcher).start()
+        send_q = self.threaded_send_q(settings)
+        send_q.start()
+        copies = OrderedDict()  # FrameRef -> copy of frame, for recent frames
+        try:
+            while True:
+                message = self.send_q.get()
+                if message == 'stop':
+                    break
+                text, image, priority = message
+                if isinstance(image, ConstantRef):
+                    image = self.constant_images[image.index]
+                elif isinstance(image, FrameRef):
+                    ref = image
+                    image = copies.get(ref)
+                    if image is None:
+                        ring = self.camlist[ref.camera].ring
+                        image = ring.copy(ref.slot, ref.seq)
+                        if image is None:
+                            continue  # frame was overwritten before it was sent
+                        copies[ref] = image
+                        if len(copies) > settings.queuemax:
+                            copies.popitem(last=False)
+                send_q.append((text, image), priority)
+        except (KeyboardInterrupt, SystemExit):
+            pass
+        finally:
+            send_q.stop_sending()
+            self.sender.close()
+
+    def stop_camera_processes(self):
+        """ Stop the detector and sender processes and free the FrameRings
         """
         for camera in self.camlist:
-            image = camera.cam.read()
-            if camera.vflip:
-                image = cv2.flip(image, -1)
-            if camera.resize_width:
-                image = imutils.resize(image, width=camera.width_pixels)
-            camera.cam_q.append(image)
-            for detector in camera.detectors:
-                self.run_detector(camera, image, detector)
+            try:
+                camera.frame_q.put_nowait(None)
+            except queue.Full:
+                pass  # the detector process will be terminated instead
+        self.send_q.stop_sending()
+        for p in self.camera_processes:
+            p.join(timeout=self.patience)
+            if p.is_alive():
+                p.terminate()
+        for camera in self.camlist:
+            camera.ring.close()
+            camera.ring.unlink()
+
+    def camera_worker(self, camera):
+        """ Read a camera and run its detectors at the camera's own framerate
 
-    def run_detector(self, camera, image, detector):
+        Runs in a separate thread for each camera when the camera_threading
+        option is True, so that a slow camera does not slow down the other
+        cameras. Each thread appends to the shared, thread safe send_q. Replay
+        cameras are paced by their own replay_fps setting instead. Reading the
+        camera blocks until it has a new frame. If the camera stops (e.g., a
+        replay source is exhausted) or fails, the cameras_stopped event is set
+        so the main thread can end the program.
+
+        Parameters:
+            camera (Camera object): camera to read in this thread
+        """
+        try:
+            while self.keep_reading:
+                self.read_camera(camera)
+        except SystemExit:
+            pass
+        except Exception:
+            logging.exception('Error reading camera ' + camera.viewname)
+        finally:
+            self.cameras_stopped.set()
+
+    def watch_camera_threads(self):
+        """ Replaces read_cameras() in the main loop if camera_threading is True
+
+        The camera threads do all camera reading and detecting, so the main
+        loop only waits here. If any camera thread has stopped, exit so that
+        the main program closes all resources and ends.
+        """
+        if self.cameras_stopped.wait(timeout=self.patience):
+            sys.exit()
+
+    def run_detector(self, camera, image, detector, frame_cache):
         """ run detector on newest image and detector queue; perform detection
 
         For each detector, add most recently acquired image to detector queue.
@@ -392,11 +916,15 @@ class ImageNode:
 
         Parameters:
             camera (Camera object): current camera
-            image (openCV image): most recently acquired camera image
+            image (openCV image or LazyFrame): most recently acquired image
             detector (Detector object): current detector to apply to image
                 queue (e.g. motion)
+            frame_cache (FrameCache): image at detection resolution and its
+                intermediate images, shared by the camera's detectors
         """
 
+        if detector.draw_roi or detector.draw_time:
+            image = as_image(image)  # drawing needs the transformed image
         if detector.draw_roi:
             cv2.rectangle(image,
                           detector.top_left,
@@ -414,8 +942,10 @@ class ImageNode:
                         detector.draw_time_color,
                         detector.draw_time_width,
                         cv2.LINE_AA)
+        if detector.skip_frame():
+            return  # detector is idle and this is not its Nth frame
         # detect state (light, etc.) and put images and events into send_q
-        detector.detect_state(camera, image, self.send_q)
+        detector.detect_state(camera, image, self.send_q, frame_cache)
 
     def fix_comm_link(self):
         """ Evaluate, repair and restart communications link with hub.
@@ -475,8 +1005,14 @@ class ImageNode:
             settings (Settings object): settings object created from YAML file
         """
 
+        if self.camera_threads:
+            self.keep_reading = False
+            for t in self.camera_threads:
+                t.join(timeout=self.patience)
         for camera in self.camlist:
             camera.cam.stop()
+            if camera.recorder:
+                camera.recorder.close()
         for light in self.lights:
             light.turn_off()
         if settings.sensors or settings.lights:
@@ -484,7 +1020,10 @@ class ImageNode:
         if self.health.stall_p:
             self.health.stall_p.terminate()
             self.health.stall_p.join()
-        if settings.send_threading:
+        if self.camera_processes:  # includes the send_q sender process
+            self.stop_camera_processes()
+        elif (settings.send_threading or settings.camera_threading
+              or settings.encode_threads):
             self.send_q.stop_sending()
         self.sender.zmq_socket.setsockopt(zmq.LINGER, 0)  # prevents ZMQ hang on exit
         self.sender.close()
@@ -513,17 +1052,54 @@ class SendQueue:
     implementation of send_q allows the imagenode.py main program to remain
     unchanged when send_threading is not set to True in the yaml settings.
 
+    The sending thread blocks on a threading.Condition while the send_q is
+    empty and is woken by append(), so it uses no CPU time when there is
+    nothing to send. append() is thread safe, so camera threads, sensor threads
+    and the heartbeat thread can all append to the same SendQueue.
+
+    If encode_threads is more than 0 (and send_type is jpg), images are
+    compressed by a pool of encode_threads threads up to 2 * encode_threads
+    messages ahead of the message being sent. cv2.imencode() releases the GIL,
+    so compressing the next images overlaps with waiting for the hub REP of
+    the current one. Messages are still sent in the order they are taken from
+    the send_q.
+
     Parameters:
         maxlen (int): maximum length of send_q deque
         send_frame (func): the ImageNode method that sends frames
         process_hub_reply (func): the ImageNode method that processes hub replies
+        capacities (dict): maximum messages per send priority class
+        use_priority (bool): True to send messages in priority class order
+        overflow (str): overflow policy when send_q is full, e.g. 'drop_oldest'
+        timeout (float): seconds to wait for room with the 'block' policy
+        decimate (int): N for the 'decimate' overflow policy
+        encode_frame (func): the ImageNode method that compresses an image
+        send_encoded (func): the ImageNode method that sends compressed images
+        encode_threads (int): number of threads compressing images ahead of
+            sending; 0 compresses each image as it is sent
 
     """
-    def __init__(self, maxlen=500, send_frame=None, process_hub_reply=None):
-        self.send_q = deque(maxlen=maxlen)
+    def __init__(self, maxlen=500, send_frame=None, process_hub_reply=None,
+                 capacities=None, use_priority=False, overflow='drop_oldest',
+                 timeout=1.0, decimate=2, encode_frame=None, send_encoded=None,
+                 encode_threads=0):
+        self.send_q = PriorityDeque(maxlen=maxlen, capacities=capacities,
+                                    use_priority=use_priority,
+                                    overflow=overflow, timeout=timeout,
+                                    decimate=decimate)
         self.send_frame = send_frame
         self.process_hub_reply = process_hub_reply
         self.keep_sending = True
+        self.stop_time = None  # time to abandon unsent messages after stopping
+        self.not_empty = threading.Condition()
+        self.thread = None
+        self.encode_frame = encode_frame
+        self.send_encoded = send_encoded
+        self.pool = None
+        self.max_in_flight = 1  # messages taken from send_q, not yet sent
+        if encode_threads and send_encoded:
+            self.pool = ThreadPoolExecutor(max_workers=encode_threads)
+            self.max_in_flight = 2 * encode_threads
 
     def __bool__(self):
         return False  # so that the read loop keeps reading forever
@@ -531,30 +1107,63 @@ class SendQueue:
     def __len__(self):
         return 0  # so that the main() send loop is never entered
 
-    def append(self, text_and_image):
-        self.send_q.append(text_and_image)
+    def append(self, text_and_image, priority=CONTINUOUS):
+        # append outside the not_empty lock; a 'block' overflow policy append
+        # waits for the sending thread, which needs the lock, to make room
+        self.send_q.append(text_and_image, priority)
+        with self.not_empty:
+            self.not_empty.notify()
+
+    def stats_text(self):
+        return self.send_q.stats_text()
 
     def send_messages_forever(self):
         # this will run in a separate thread
-        # the "sleep()" calls allow main thread more time for image capture
-        while self.keep_sending:
-            if len(self.send_q) > 0:  # send until send_q is empty
-                text, image = self.send_q.popleft()
-                sleep(0.0000001)  # sleep before sending
-                hub_reply = self.send_frame(text, image)
-                self.process_hub_reply(hub_reply)
+        # it waits on the not_empty Condition until there is something to send
+        in_flight = deque()  # (text, image or Future of jpg_buffer) to send
+        while True:
+            with self.not_empty:
+                while self.keep_sending and not self.send_q and not in_flight:
+                    self.not_empty.wait()
+                if not self.send_q and not in_flight:
+                    break  # stopped and all messages have been sent
+                if not self.keep_sending and perf_counter() > self.stop_time:
+                    break  # stopped and out of time; abandon unsent messages
+                while self.send_q and len(in_flight) < self.max_in_flight:
+                    text, image = self.send_q.popleft()
+                    if self.pool:  # start compressing image ahead of sending
+                        image = self.pool.submit(self.encode_frame, image)
+                    in_flight.append((text, image))
+            text, image = in_flight.popleft()
+            if self.pool:
+                hub_reply = self.send_encoded(text, image.result())
             else:
-                sleep(0.0000001)  # sleep before checking send_q again
+                hub_reply = self.send_frame(text, image)
+            self.process_hub_reply(hub_reply)
+        if self.pool:
+            self.pool.shutdown(wait=False)
 
     def start(self):
-        # start the thread to read frames from the video stream
-        t = threading.Thread(target=self.send_messages_forever)
-        t.daemon = True
-        t.start()
+        # start the thread to send the (text, image) tuples in the send_q
+        self.thread = threading.Thread(target=self.send_messages_forever)
+        self.thread.daemon = True
+        self.thread.start()
 
-    def stop_sending(self):
-        self.keep_sending = False
-        sleep(0.0000001)  # sleep to allow ZMQ to clear buffer
+    def stop_sending(self, timeout=1.0):
+        """ Stop the sending thread after it sends the messages in the send_q
+
+        Messages still unsent after timeout seconds are abandoned. Waits at
+        most timeout seconds, even if a send is waiting for a hub reply.
+
+        Parameters:
+            timeout (float): maximum seconds to spend sending unsent messages
+        """
+        with self.not_empty:
+            self.keep_sending = False
+            self.stop_time = perf_counter() + timeout
+            self.not_empty.notify_all()
+        if self.thread:
+            self.thread.join(timeout=timeout)
 
 
 class Sensor:
@@ -666,7 +1275,7 @@ class Sensor:
             temp_text = str(temperature) + " " + self.unit
             text = '|'.join([self.event_text, 'Temp', temp_text])
             text_and_image = (text, self.tiny_image)
-            self.send_q.append(text_and_image)
+            self.send_q.append(text_and_image, SENSOR)
             self.last_reading_temp = temperature
         if abs(humidity - self.last_reading_humidity) >= self.min_difference:
             # humidity has changed from last reported humidity, therefore
@@ -676,7 +1285,7 @@ class Sensor:
             # first letter test of "Heartbeat" in imagehub
             text = '|'.join([self.event_text, 'humidity', humidity_text])
             text_and_image = (text, self.tiny_image)
-            self.send_q.append(text_and_image)
+            self.send_q.append(text_and_image, SENSOR)
             self.last_reading_humidity = humidity
 
 
@@ -746,13 +1355,20 @@ class PiCameraUnthreadedStream():
                                                      format="bgr",
                                                      use_video_port=True)
         self.frame = None
+        self.frame_seq = 0  # sequence number of the last frame read
+        self.frame_time = 0.0  # capture time of the last frame read
 
     def read(self):
         f = next(self.stream)  # or f = self.stream.read()?
+        self.frame_time = time()
+        self.frame_seq += 1
         self.frame = f.array
         self.rawCapture.truncate(0)
         return self.frame
 
+    def ready(self):
+        return True  # read() waits for the next frame itself
+
     def stop(self):
         self.close()
 
@@ -763,6 +1379,278 @@ class PiCameraUnthreadedStream():
 
 
 
+class WebcamUnthreadedStream():
+    """ Reads a webcam without threading.
+
+    Each read() waits for the next frame from the webcam. Used by a
+    FrameGrabber to read a webcam in a thread. For compatibility, the method
+    names are the same as imutils.VideoStream.
+
+    Parameters:
+        src (int): cv2.VideoCapture() webcam number
+        pool (BufferPool): where frame buffers come from, or None to allocate
+    """
+    def __init__(self, src=0, pool=None):
+        self.stream = cv2.VideoCapture(src)
+        self.pool = pool
+        self.frame = None
+        self.frame_seq = 0  # sequence number of the last frame read
+        self.frame_time = 0.0  # capture time of the last frame read
+
+    def read(self):
+        buffer = None  # the first frame sets the shape of the pool buffers
+        if self.pool is not None and self.frame is not None:
+            buffer = self.pool.get(self.frame.shape, self.frame.dtype)
+        grabbed, frame = self.stream.read(buffer)
+        self.frame_time = time()
+        self.frame_seq += 1
+        self.frame = frame if grabbed else None
+        return self.frame
+
+    def stop(self):
+        self.close()
+
+    def close(self):
+        self.stream.release()
+
+
+class FrameGrabber():
+    """ Reads a camera in a thread and returns each new frame only once.
+
+    Replaces imutils.VideoStream for threaded camera reading. The read() of an
+    imutils.VideoStream returns the most recent frame at once, so a loop that
+    reads faster than the camera framerate gets the same frame again, runs
+    the detectors on it again, and spins while the camera is slow. A
+    FrameGrabber thread reads an unthreaded stream, whose read() waits for the
+    next frame from the camera, and keeps the newest frame. Its read() waits
+    until there is a frame that has not been read yet. If the reader falls
+    behind, it gets the newest frame and the older ones are skipped. Like the
+    unthreaded streams, it sets frame_seq and frame_time to the sequence
+    number and capture time of the frame read.
+
+    With target_fps, a new frame is only ready once 1 / target_fps seconds
+    have passed since the last frame that was read, so a camera can be
+    detected at a lower rate than its framerate without any sleep().
+
+    Every FrameGrabber notifies the same new_frame Condition, so that a
+    FrameScheduler can wait for a new frame from any of the cameras.
+
+    Parameters:
+        stream: unthreaded stream, e.g., PiCameraUnthreadedStream
+        target_fps (float): most frames per second to read, or None for all
+    """
+
+    new_frame = threading.Condition()  # one Condition for every FrameGrabber
+
+    def __init__(self, stream, target_fps=None):
+        self.stream = stream
+        self.camera = getattr(stream, 'camera', None)  # PiCamera settings
+        self.interval = 1.0 / target_fps if target_fps else 0.0
+        self.next_time = perf_counter()
+        self.frame = None
+        self.seq = 0  # number of frames grabbed
+        self.grab_time = 0.0  # capture time of the newest frame grabbed
+        self.frame_seq = 0  # seq of the last frame read
+        self.frame_time = 0.0  # capture time of the last frame read
+        self.stopped = False
+        self.thread = threading.Thread(daemon=True, target=self.update)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def update(self):
+        try:
+            while not self.stopped:
+                frame = self.stream.read()
+                if frame is None:
+                    logging.error('Camera stopped returning frames.')
+                    break
+                with FrameGrabber.new_frame:
+                    self.frame = frame
+                    self.seq += 1
+                    self.grab_time = self.stream.frame_time
+                    FrameGrabber.new_frame.notify_all()
+        except Exception:
+            logging.exception('Error reading camera in FrameGrabber.')
+        finally:
+            with FrameGrabber.new_frame:
+                self.stopped = True
+                FrameGrabber.new_frame.notify_all()
+
+    def ready(self):
+        """ True if there is a new frame to read, or if the camera stopped
+        """
+        return self.stopped or (self.seq > self.frame_seq
+                                and perf_counter() >= self.next_time)
+
+    def read(self):
+        """ Wait for a frame that has not been read yet and return it
+
+        If the camera has stopped, end the program (the camera_threading
+        thread ends and sets cameras_stopped).
+        """
+        with FrameGrabber.new_frame:
+            FrameGrabber.new_frame.wait_for(self.ready)
+            if self.stopped:
+                sys.exit()
+            self.frame_seq = self.seq
+            self.frame_time = self.grab_time
+            if self.interval:
+                self.next_time = max(self.next_time + self.interval,
+                                     perf_counter())
+            return self.frame
+
+    def stop(self):
+        with FrameGrabber.new_frame:
+            self.stopped = True
+            FrameGrabber.new_frame.notify_all()
+        self.thread.join(timeout=1.0)  # read() of the stream can take a frame
+        self.stream.stop()
+
+
+class FrameScheduler():
+    """ Waits until any of the cameras has a new frame.
+
+    Cameras read by a FrameGrabber are ready when they have a new frame.
+    Unthreaded cameras (threaded_read False) and replays are always ready,
+    since their read() waits for their next frame itself.
+
+    Parameters:
+        camlist (list): the Camera objects of the ImageNode
+    """
+    def __init__(self, camlist):
+        self.camlist = camlist
+
+    def ready(self):
+        return [camera for camera in self.camlist if camera.cam.ready()]
+
+    def ready_cameras(self, timeout=0.1):
+        """ Return the cameras that have a new frame, waiting for one
+
+        Parameters:
+            timeout (float): most seconds to wait, so that the main loop can
+                still send sensor and heartbeat messages if cameras stall
+        """
+        with FrameGrabber.new_frame:
+            return FrameGrabber.new_frame.wait_for(self.ready, timeout) or []
+
+
+class ReplayStream():
+    """ Reads images from an image directory, video file or frame archive.
+
+    Replays previously captured images as a substitute for a camera, so that
+    detector settings and imagenode throughput can be tested and compared on
+    any computer using the same footage every time. The source can be a
+    directory of image files (read in sorted filename order), a video file
+    that OpenCV can read, or a frame archive written by the camera record
+    option. Frame archive frames are memory mapped, so they are replayed
+    without any image decoding or copying. Frames are replayed at replay_fps, or as fast as
+    possible if replay_fps is 0. For compatibility, the method names are the
+    same as imutils.VideoStream.
+
+    When the source is exhausted and replay_loop is False, the number of
+    frames replayed and the FPS achieved are logged and the program exits.
+
+    Parameters:
+        src (str): path of an image directory, video file or frame archive
+        replay_fps (float): frames per second to replay; 0 is "fast as possible"
+        replay_loop (bool): True to restart at the first frame when exhausted
+    """
+    image_extensions = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff')
+
+    def __init__(self, src, replay_fps=0, replay_loop=False):
+        self.src = os.path.expanduser(src)
+        self.replay_fps = replay_fps
+        self.replay_loop = replay_loop
+        self.filenames = None
+        self.video = None
+        self.archive = None
+        if is_frame_archive(self.src):
+            self.archive = FrameArchive(self.src)
+        elif os.path.isdir(self.src):
+            self.filenames = sorted(
+                os.path.join(self.src, name) for name in os.listdir(self.src)
+                if name.lower().endswith(self.image_extensions))
+            if not self.filenames:
+                raise FileNotFoundError('No image files in ' + self.src)
+        else:
+            self.video = cv2.VideoCapture(self.src)
+            if not self.video.isOpened():
+                raise FileNotFoundError('Cannot open video file ' + self.src)
+        self.frame = None
+        self.frame_seq = 0  # sequence number of the last frame read; not rewound
+        self.frame_time = 0.0  # time the last frame was read
+        self.rewind()
+
+    def start(self):
+        return self
+
+    def rewind(self):
+        """ Restart the replay at the first frame and reset the FPS counters
+        """
+        self.position = 0
+        if self.video is not None:
+            self.video.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        self.frame_count = 0
+        self.start_time = perf_counter()
+        self.next_time = self.start_time
+
+    def next_frame(self):
+        """ Return the next frame from the source or None if it is exhausted
+        """
+        if self.archive is not None:
+            if self.position >= len(self.archive):
+                return None
+            frame = self.archive[self.position]
+            self.position += 1
+            return frame
+        if self.filenames is not None:
+            if self.position >= len(self.filenames):
+                return None
+            frame = cv2.imread(self.filenames[self.position])
+            self.position += 1
+            return frame
+        ret_code, frame = self.video.read()
+        return frame if ret_code else None
+
+    def read(self):
+        if self.replay_fps:  # wait until it is time for the next frame
+            sleep(max(0, self.next_time - perf_counter()))
+            self.next_time = max(self.next_time + 1 / self.replay_fps,
+                                 perf_counter())
+        frame = self.next_frame()
+        if frame is None:
+            if not self.replay_loop:
+                self.log_fps()
+                sys.exit()
+            self.rewind()
+            frame = self.next_frame()
+        self.frame_count += 1
+        self.frame_seq += 1
+        self.frame_time = time()
+        self.frame = frame
+        return self.frame
+
+    def ready(self):
+        return True  # read() waits until it is time for the next frame itself
+
+    def log_fps(self):
+        seconds = perf_counter() - self.start_time
+        fps = self.frame_count / seconds if seconds else 0
+        logging.info('Replay of %s ended: %d frames in %.2f seconds = %.2f FPS',
+                     self.src, self.frame_count, seconds, fps)
+
+    def stop(self):
+        self.close()
+
+    def close(self):
+        if self.video is not None:
+            self.video.release()
+        if self.archive is not None:
+            self.archive.close()
+
+
 class Camera:
     """ Methods and attributes of a camera
 
@@ -799,6 +1687,14 @@ class Camera:
             self.framerate = cameras[camera]['framerate']
         else:
             self.framerate = 32
+        self.frame_seq = 0  # frame_seq of the last frame read from self.cam
+        self.duplicate_frames = 0  # frames read again and dropped
+        self.cam_q_entry = None  # cam_q item of the frame being detected
+        self.stale_frames = 0  # event images overwritten in a FrameRing
+        if 'target_fps' in cameras[camera]:  # read frames at most this often
+            self.target_fps = cameras[camera]['target_fps']
+        else:
+            self.target_fps = None  # default is to read every new frame
         if 'vflip' in cameras[camera]:
             self.vflip = cameras[camera]['vflip']
         else:
@@ -809,6 +1705,11 @@ class Camera:
             self.resize_width = cameras[camera]['resize_width']
         else:
             self.resize_width = None
+        if 'detect_resize_width' in cameras[camera]:
+            # detect_resize_width is a percentage of the resized image width
+            self.detect_resize_width = cameras[camera]['detect_resize_width']
+        else:
+            self.detect_resize_width = None  # detect at the resized resolution
         if 'viewname' in cameras[camera]:
             self.viewname = cameras[camera]['viewname']
         else:
@@ -849,20 +1750,69 @@ class Camera:
             self.awb_mode = cameras[camera]['awb_mode']
         else:
             self.awb_mode = 'auto'  # default value
+        if 'replay' in cameras[camera]:
+            # path of image directory or video file to read instead of camera
+            self.replay = cameras[camera]['replay']
+        else:
+            self.replay = None
+        if 'replay_fps' in cameras[camera]:
+            self.replay_fps = cameras[camera]['replay_fps']
+        else:
+            self.replay_fps = 0  # default is to replay as fast as possible
+        if 'replay_loop' in cameras[camera]:
+            self.replay_loop = cameras[camera]['replay_loop']
+        else:
+            self.replay_loop = False
+        if 'record' in cameras[camera]:
+            # path of frame archive to record captured frames into
+            self.record = cameras[camera]['record']
+        else:
+            self.record = None
+        if 'record_max_frames' in cameras[camera]:
+            self.record_max_frames = cameras[camera]['record_max_frames']
+        else:
+            self.record_max_frames = None  # default is no limit
+        self.recorder = None
+        if self.record:
+            self.recorder = FrameArchiveWriter(self.record,
+                                               max_frames=self.record_max_frames)
+
+        if 'continuous_fps' in cameras[camera]:
+            self.continuous_fps = cameras[camera]['continuous_fps']
+        else:
+            self.continuous_fps = None  # default is no limit
+        if 'continuous_bandwidth' in cameras[camera]:
+            self.continuous_bandwidth = cameras[camera]['continuous_bandwidth']
+        else:
+            self.continuous_bandwidth = None  # default is no limit
+        if 'continuous_every_nth' in cameras[camera]:
+            self.continuous_every_nth = cameras[camera]['continuous_every_nth']
+        else:
+            self.continuous_every_nth = None  # default is node setting
 
         self.detectors = []
         if 'detectors' in cameras[camera]:  # is there at least one detector
             self.setup_detectors(cameras[camera]['detectors'],
                                  settings.nodename,
                                  self.viewname)
-        if camera[0].lower() == 'p':  # this is a picam
-            # start PiCamera and warm up; inherits methods from
-            # imutils.VideoStream unless threaded_read is False; then uses class
+        # pools of reused image buffers for webcam frames and for transformed
+        # frames; a frame can be held by the cam_q and by the jpg EncodeCache
+        self.raw_pool = BufferPool(size=2 * settings.queuemax + 4)
+        self.frame_pool = BufferPool(size=2 * settings.queuemax + 4)
+        if self.replay:  # replay stored images instead of reading a camera
+            self.cam = ReplayStream(self.replay,
+                                    replay_fps=self.replay_fps,
+                                    replay_loop=self.replay_loop)
+            self.cam_type = 'replay'
+        elif camera[0].lower() == 'p':  # this is a picam
+            # start PiCamera and warm up; a FrameGrabber reads it in a thread
+            # unless threaded_read is False; then uses class
             # PiCameraUnthreadedStream to read the PiCamera in an unthreaded way
             if self.threaded_read:
-                self.cam = VideoStream(usePiCamera=True,
-                                       resolution=self.resolution,
-                                       framerate=self.framerate).start()
+                self.cam = FrameGrabber(
+                    PiCameraUnthreadedStream(resolution=self.resolution,
+                                             framerate=self.framerate),
+                    target_fps=self.target_fps).start()
             else:
                 self.cam = PiCameraUnthreadedStream(resolution=self.resolution,
                                                     framerate=self.framerate)
@@ -893,9 +1843,12 @@ class Camera:
                 self.cam.camera.awb_mode = self.awb_mode
             self.cam_type = 'PiCamera'
         else:  # this is a webcam (not a picam)
-            self.cam = VideoStream(src=0).start()
+            self.cam = FrameGrabber(WebcamUnthreadedStream(src=self.src,
+                                                           pool=self.raw_pool),
+                                    target_fps=self.target_fps).start()
             self.cam_type = 'webcam'
-        sleep(3.0)  # allow camera sensor to warm up
+        if self.cam_type != 'replay':
+            sleep(3.0)  # allow camera sensor to warm up
 
         # self.text is the text label for images from this camera.
         # Each image that is sent is sent with a text label so the hub can
@@ -908,7 +1861,45 @@ class Camera:
         self.text = '|'.join([node_and_view, settings.send_type])
 
         # set up camera image queue
-        self.cam_q = deque(maxlen=settings.queuemax)
+        if 'cam_q_overflow' in cameras[camera]:
+            self.cam_q_overflow = cameras[camera]['cam_q_overflow']
+        else:
+            self.cam_q_overflow = 'drop_oldest'
+        if self.cam_q_overflow not in CAM_Q_OVERFLOW_POLICIES:
+            raise ValueError('Unknown cam_q_overflow: {}; use one of {}'.format(
+                self.cam_q_overflow, ', '.join(CAM_Q_OVERFLOW_POLICIES)))
+        if 'cam_q_decimate' in cameras[camera]:
+            self.cam_q_decimate = cameras[camera]['cam_q_decimate']
+        else:
+            self.cam_q_decimate = 2  # keep every 2nd frame when cam_q is full
+        if 'cam_q_store' in cameras[camera]:
+            self.cam_q_store = cameras[camera]['cam_q_store']
+        else:
+            self.cam_q_store = 'image'  # keep frames as they are
+        if self.cam_q_store not in CAM_Q_STORES:
+            raise ValueError('Unknown cam_q_store: {}; use one of {}'.format(
+                self.cam_q_store, ', '.join(CAM_Q_STORES)))
+        if 'cam_q_bytes' in cameras[camera]:
+            self.cam_q_bytes = cameras[camera]['cam_q_bytes']
+        else:
+            self.cam_q_bytes = None  # no memory limit; queuemax frames
+        if 'cam_q_scale' in cameras[camera]:
+            self.cam_q_scale = cameras[camera]['cam_q_scale']
+        else:
+            self.cam_q_scale = 50  # percent of frame width and height
+        if self.cam_q_store == 'image' and not self.cam_q_bytes:
+            self.cam_q = OverflowDeque(maxlen=settings.queuemax,
+                                       overflow=self.cam_q_overflow,
+                                       decimate=self.cam_q_decimate)
+        else:  # a memory limit replaces the queuemax frames limit
+            self.cam_q = FrameHistory(
+                maxlen=None if self.cam_q_bytes else settings.queuemax,
+                overflow=self.cam_q_overflow,
+                decimate=self.cam_q_decimate,
+                store=self.cam_q_store,
+                max_bytes=self.cam_q_bytes,
+                quality=settings.jpeg_quality,
+                scale=self.cam_q_scale)
 
     def setup_detectors(self, detectors, nodename, viewname):
         """ Create a list of detectors for this camera
@@ -994,6 +1985,21 @@ class Detector:
                 self.print_still_frames = detectors[detector]['print_still_frames']
             else:
                 self.print_still_frames = True  # True is default print_still_frames
+            if 'region_padding' in detectors[detector]:
+                self.region_padding = detectors[detector]['region_padding']
+            else:
+                self.region_padding = 16  # pixels added around motion regions
+            if 'motion_scoring' in detectors[detector]:
+                self.motion_scoring = detectors[detector]['motion_scoring']
+            else:
+                self.motion_scoring = 'contours'  # or 'fast'
+            if 'background_model' in detectors[detector]:
+                self.background_model = detectors[detector]['background_model']
+            else:
+                self.background_model = 'average'  # running average
+            self.background = background_model(self.background_model,
+                                               self.delta_threshold)
+            self.dilated = None  # dilated motion pixels, allocated once
 
         if 'ROI' in detectors[detector]:
             self.roi_pct = literal_eval(detectors[detector]['ROI'])
@@ -1045,16 +2051,59 @@ class Detector:
                 self.frame_count = 0
         else:
             self.frame_count = -1  # send continuous flag
+        # send_frames can also include 'roi' to send only the ROI of each image
+        # and 'gray' to send the ROI in grayscale, e.g., 'detected event roi'
+        self.send_roi = 'roi' in str(send_frames)
+        self.send_roi_gray = self.send_roi and 'gray' in str(send_frames)
+        # motion detector send_frames can include 'regions' to send only crops
+        # of the regions of the image where motion was detected
+        self.send_regions = (self.detector_type == 'motion'
+                             and 'region' in str(send_frames))
         # send_count option is an integer of how many frames to send if event
         if 'send_count' in detectors[detector]:
             self.send_count = detectors[detector]['send_count']
         else:
             self.send_count = 5  # default number of frames to send per event
+        if self.detector_type == 'motion':
+            # (cam_q item, regions) of recent frames with motion regions;
+            #  an event replays at most the send_count newest cam_q frames
+            self.frame_regions = deque(maxlen=self.send_count)
         # send_test_images option: if True, send test images like ROI, Gray
         if 'send_test_images' in detectors[detector]:
             self.send_test_images = detectors[detector]['send_test_images']
         else:
             self.send_test_images = False  # default is NOT to send test images
+        # continuous_fps, continuous_bandwidth, continuous_every_nth options
+        #  limit the rate of images sent when send_frames is continuous
+        if 'continuous_fps' in detectors[detector]:
+            self.continuous_fps = detectors[detector]['continuous_fps']
+        else:
+            self.continuous_fps = None  # default is no limit
+        if 'continuous_bandwidth' in detectors[detector]:
+            self.continuous_bandwidth = detectors[detector]['continuous_bandwidth']
+        else:
+            self.continuous_bandwidth = None  # default is no limit
+        if 'continuous_every_nth' in detectors[detector]:
+            self.continuous_every_nth = detectors[detector]['continuous_every_nth']
+        else:
+            self.continuous_every_nth = None  # default is camera setting
+        self.continuous_limiter = None  # set by ImageNode.setup_rate_limiters
+        # idle_after and idle_every_nth options: once the state of each frame
+        #  has matched current_state for idle_after seconds, detect only every
+        #  Nth frame until a frame's state differs from current_state again
+        if 'idle_after' in detectors[detector]:
+            self.idle_after = detectors[detector]['idle_after']
+        else:
+            self.idle_after = None  # default is to detect every frame
+        if 'idle_every_nth' in detectors[detector]:
+            self.idle_every_nth = detectors[detector]['idle_every_nth']
+        else:
+            self.idle_every_nth = 4  # 4 is default when idle_after is set
+        if self.frame_count == -1 or self.send_test_images:
+            self.idle_after = None  # continuous sending needs every frame
+        self.idle = False
+        self.idle_frames = 0  # frames since idle, detected or skipped
+        self.stable_since = perf_counter()
 
         # self.event_text is the text message for this detector that is
         # sent when the detector state changes
@@ -1074,7 +2123,7 @@ class Detector:
             # set the blank image wide enough to hold message of send_test_images
             self.msg_image = np.zeros((5, 320), dtype="uint8")  # blank image wide
 
-    def detect_state(self, camera, image, send_q):
+    def detect_state(self, camera, image, send_q, frame_cache):
         """ Placeholder function will be set to specific detection function
 
         For example, detect_state() will be set to detect_light() during
@@ -1083,7 +2132,7 @@ class Detector:
         print('Therefore, should never get to this print statement')
         pass
 
-    def detect_light(self, camera, image, send_q):
+    def detect_light(self, camera, image, send_q, frame_cache):
         """ Detect if ROI is 'lighted' or 'dark'; send event message and images
 
         After adding current image to 'event state' history queue, detect if the
@@ -1100,29 +2149,35 @@ class Detector:
             camera (Camera object): current camera
             image (OpenCV image): current image
             send_q (Deque): where (text, image) tuples are appended to be sent
+            frame_cache (FrameCache): current image at detection resolution
+                and its grayscale and blurred images
         """
 
         # if we are sending images continuously, append current image to send_q
         if self.frame_count == -1:  # -1 code to send all frames continuously
-            text_and_image = (camera.text, image)
-            send_q.append(text_and_image)
-
-        # crop ROI & convert to grayscale
-        x1, y1 = self.top_left
-        x2, y2 = self.bottom_right
-        ROI = image[y1:y2, x1:x2]
-        gray = cv2.cvtColor(ROI, cv2.COLOR_BGR2GRAY)
+            send_image = self.frame_to_send(image)
+            if (self.continuous_limiter is None
+                    or self.continuous_limiter.allow(send_image)):
+                text_and_image = (camera.text, send_image)
+                send_q.append(text_and_image, CONTINUOUS)
+
+        # get grayscale ROI, computed once per frame for all detectors
+        gray = frame_cache.gray(self.detect_top_left, self.detect_bottom_right)
         # calculate current_state of ROI
-        gray_mean = int(np.mean(gray))
+        gray_mean = int(frame_cache.mean(self.detect_top_left,
+                                         self.detect_bottom_right))
         if gray_mean > self.threshold:
             state = 'lighted'
             state_num = 1
         else:
             state = 'dark'
             state_num = -1
+        self.update_idle(state)
         if self.send_test_images:
+            x1, y1 = self.detect_top_left
+            x2, y2 = self.detect_bottom_right
             images = []
-            images.append(('ROI', ROI,))
+            images.append(('ROI', frame_cache.image[y1:y2, x1:x2],))
             images.append(('Grayscale', gray,))
             state_values = []
             state_values.append(('State', state,))
@@ -1149,7 +2204,7 @@ class Detector:
         if self.log_roi_name:
             text = '|'.join([text, self.roi_name])
         text_and_image = (text, self.msg_image)
-        send_q.append(text_and_image)
+        send_q.append(text_and_image, EVENT)
 
         # if frame_count = -1, then already sending images continuously...
         #   so no need to send the images of this detected event
@@ -1158,13 +2213,18 @@ class Detector:
         if self.frame_count > 0:  # then need to send images of this event
             send_count = min(len(camera.cam_q), self.send_count)
             for i in range(-send_count, -1):
-                text_and_image = (camera.text, camera.cam_q[i])
-                send_q.append(text_and_image)
+                try:
+                    text_and_image = (camera.text,
+                                      self.frame_to_send(camera.cam_q[i]))
+                except StaleFrame:  # overwritten in its FrameRing slot
+                    camera.stale_frames += 1
+                    continue
+                send_q.append(text_and_image, EVENT_IMAGE)
 
         # Now that current state has been sent, it becomes the last_state
         self.last_state = self.current_state
 
-    def detect_motion(self, camera, image, send_q):
+    def detect_motion(self, camera, image, send_q, frame_cache):
         """ Detect if ROI is 'moving' or 'still'; send event message and images
 
         After adding current image to 'event state' history queue, detect if the
@@ -1181,54 +2241,65 @@ class Detector:
             camera (Camera object): current camera
             image (OpenCV image): current image
             send_q (Deque): where (text, image) tuples are appended to be sent
+            frame_cache (FrameCache): current image at detection resolution
+                and its grayscale and blurred images
 
         This function borrowed a lot from a motion detector tutorial post by
         Adrian Rosebrock on PyImageSearch.com. See README.rst for details.
         """
 
-        #####
-        # Branch to fix duplicate frames; see GitHub issues #15 (&#12)
-        #####
+        # duplicate frames (see GitHub issues #15 & #12) never get here; they
+        # are dropped by ImageNode.capture_frame()
 
         # if we are sending images continuously, append current image to send_q
-        if self.frame_count == -1:  # -1 code ==> send all frames continuously
-            text_and_image = (camera.text, image)
-            send_q.append(text_and_image)  # send current image
-
-        # crop ROI & convert to grayscale & apply GaussianBlur
-        x1, y1 = self.top_left
-        x2, y2 = self.bottom_right
-        ROI = image[y1:y2, x1:x2]
-        gray = cv2.cvtColor(ROI, cv2.COLOR_BGR2GRAY)
-        gray = cv2.GaussianBlur(gray,
-                                (self.blur_kernel_size, self.blur_kernel_size),
-                                0)
-        # If no history yet, save the first image as the  average image
-        if self.total_frames < 1:
-            self.average = gray.copy().astype('float')
-        else:
-            # add gray image to weighted average image
-            cv2.accumulateWeighted(gray, self.average, 0.5)
-        # frame delta is the absolute difference between gray and self.average
-        frameDelta = cv2.absdiff(gray, cv2.convertScaleAbs(self.average))
-        # threshold the frame delta image and dilate the thresholded image
-        thresholded = cv2.threshold(frameDelta, self.delta_threshold,
-                                    255, cv2.THRESH_BINARY)[1]
-        thresholded = cv2.dilate(thresholded, None, iterations=2)
-        # find contours in thresholded image
-        # OpenCV version 3.x returns a 3 value tuple
-        # OpenCV version 4.x returns a 2 value tuple
-        contours_tuple = cv2.findContours(thresholded.copy(),
-                                          cv2.RETR_EXTERNAL,
-                                          cv2.CHAIN_APPROX_SIMPLE)
-        contours = contours_tuple[-2]  # captures contours value correctly for both versions of OpenCV
+        # (if sending motion regions, they are appended once they are found)
+        if self.frame_count == -1 and not self.send_regions:
+            send_image = self.frame_to_send(image)
+            if (self.continuous_limiter is None
+                    or self.continuous_limiter.allow(send_image)):
+                text_and_image = (camera.text, send_image)
+                send_q.append(text_and_image, CONTINUOUS)  # send current image
+
+        # get grayscale ROI after GaussianBlur, computed once per frame for
+        # all detectors with the same blur_kernel_size
+        gray = frame_cache.blurred(self.detect_top_left,
+                                   self.detect_bottom_right,
+                                   self.blur_kernel_size)
+        # add gray image to the background model and get the thresholded
+        # frame delta between them; then dilate the thresholded image
+        # (each step writes into a buffer allocated once for this ROI)
+        frameDelta, thresholded = self.background.apply(gray)
+        self.dilated = cv2.dilate(thresholded, None, dst=self.dilated,
+                                  iterations=2)
+        thresholded = self.dilated
+        if self.motion_scoring == 'fast' and self.provably_still(thresholded):
+            contours = []  # no contour could have an area of min_area_pixels
+        else:
+            # find contours in thresholded image; findContours doesn't modify
+            # its source image since OpenCV 3.2, so no copy of it is needed
+            # OpenCV version 3.x returns a 3 value tuple
+            # OpenCV version 4.x returns a 2 value tuple
+            contours_tuple = cv2.findContours(thresholded,
+                                              cv2.RETR_EXTERNAL,
+                                              cv2.CHAIN_APPROX_SIMPLE)
+            contours = contours_tuple[-2]  # captures contours value correctly for both versions of OpenCV
         state = 'still'
         area = 0
+        regions = []
         for contour in contours:
             area = cv2.contourArea(contour)
             if area < self.min_area_pixels:
                 continue
             state = 'moving'
+            if self.send_regions:
+                regions.append(self.motion_region(contour, image.shape))
+        self.update_idle(state)
+        if regions:
+            if camera.cam_q_entry is not None:  # frame was kept in the cam_q
+                self.frame_regions.append((camera.cam_q_entry, regions))
+            if self.frame_count == -1:  # send motion regions continuously
+                self.send_motion_regions(camera, image, regions, state,
+                                         send_q, CONTINUOUS)
         if state == 'moving':
             self.moving_frames += 1
         else:
@@ -1236,19 +2307,19 @@ class Detector:
             self.still_frames += 1
         # Optionally, send various test images to visually tune settings
         if self.send_test_images:  # send some intermediate test images
+            x1, y1 = self.detect_top_left
+            x2, y2 = self.detect_bottom_right
             images = []
-            images.append(('ROI', ROI,))
+            images.append(('ROI', frame_cache.image[y1:y2, x1:x2],))
             images.append(('Grayscale', gray,))
-            images.append(('frameDelta', frameDelta,))
-            images.append(('thresholded', thresholded,))
+            # copies, since the buffers are overwritten by the next frame
+            images.append(('frameDelta', frameDelta.copy(),))
+            images.append(('thresholded', thresholded.copy(),))
             state_values = []
             state_values.append(('State', self.current_state,))
             state_values.append(('N Contours', str(len(contours)),))
             state_values.append(('Area', str(area),))
             self.send_test_data(images, state_values, send_q)
-        else:
-            sleep(0.02)  # for testing
-            pass
 
         self.total_frames += 1
         if self.total_frames < self.min_frames:
@@ -1272,7 +2343,7 @@ class Detector:
         if self.log_roi_name:
             text = '|'.join([text, self.roi_name])
         text_and_image = (text, self.msg_image)
-        send_q.append(text_and_image)
+        send_q.append(text_and_image, EVENT)
 
         # if frame_count = -1, then already sending images continuously...
         #   so no need to send the images of this detected event
@@ -1282,13 +2353,148 @@ class Detector:
             send_count = min(len(camera.cam_q), self.send_count)
             if (self.current_state == 'still') and (self.print_still_frames is False):
                 send_count = 0
+            if self.send_regions:  # the regions found in each cam_q frame
+                frame_regions = {id(frame): (frame, regions)
+                                 for frame, regions in self.frame_regions}
             for i in range(-send_count, -1):
-                text_and_image = (camera.text, camera.cam_q[i])
-                send_q.append(text_and_image)
+                try:
+                    if self.send_regions:  # frames without motion are skipped
+                        frame, regions = frame_regions.get(id(camera.cam_q[i]),
+                                                           (None, None))
+                        if frame is camera.cam_q[i]:
+                            self.send_motion_regions(camera, frame, regions,
+                                                     self.current_state,
+                                                     send_q, EVENT_IMAGE)
+                        continue
+                    text_and_image = (camera.text,
+                                      self.frame_to_send(camera.cam_q[i]))
+                except StaleFrame:  # overwritten in its FrameRing slot
+                    camera.stale_frames += 1
+                    continue
+                send_q.append(text_and_image, EVENT_IMAGE)
 
         # Now that current state has been sent, it becomes the last_state
         self.last_state = self.current_state
 
+    def frame_to_send(self, image):
+        """ Return the image to send: image, or only its ROI if send_roi is set
+
+        When send_frames includes 'roi', only the ROI of the image is sent, so
+        the bytes sent are reduced by the ratio of ROI area to image area, and
+        the ROI keeps the full camera resolution. With 'gray', the ROI is
+        converted to grayscale, reducing the bytes sent by another 2/3.
+
+        Parameters:
+            image (OpenCV image or LazyFrame): a camera image
+        """
+        if not self.send_roi:
+            return as_image(image)
+        x1, y1 = self.top_left
+        x2, y2 = self.bottom_right
+        ROI = image[y1:y2, x1:x2]
+        if self.send_roi_gray and ROI.ndim == 3:
+            return cv2.cvtColor(ROI, cv2.COLOR_BGR2GRAY)
+        return np.ascontiguousarray(ROI)  # imagezmq sends contiguous arrays
+
+    def motion_region(self, contour, shape):
+        """ Return the padded bounding box of a motion contour in the image
+
+        The contour is in pixels of the ROI of the detection resolution image,
+        so the box is moved and scaled to pixels of the image to be sent.
+
+        Parameters:
+            contour (array): contour found in the thresholded ROI
+            shape (tuple): shape of the image
+
+        Returns:
+            (x1, y1, x2, y2) image pixel coordinates of the motion region
+        """
+        x, y, w, h = cv2.boundingRect(contour)
+        scale = self.detect_scale
+        x = int((x + self.detect_top_left[0]) * scale)  # to image coordinates
+        y = int((y + self.detect_top_left[1]) * scale)
+        w = int(w * scale + 0.5)
+        h = int(h * scale + 0.5)
+        pad = self.region_padding
+        return (max(x - pad, 0), max(y - pad, 0),
+                min(x + w + pad, shape[1]), min(y + h + pad, shape[0]))
+
+    def send_motion_regions(self, camera, image, regions, state, send_q,
+                            priority):
+        """ Append a crop of image for each motion region to send_q
+
+        The text of each crop has a state and the region's image pixel
+        coordinates appended, e.g., 'Barn Door|jpg|moving|(12,40),(96,120)'.
+        Continuous crops are each limited by the continuous_limiter.
+
+        Parameters:
+            camera (Camera object): current camera
+            image (OpenCV image): image to crop
+            regions (list): (x1, y1, x2, y2) image coordinates of each region
+            state (str): the state of the image itself for continuous crops,
+                or the detector's current_state for event crops
+            send_q (Deque): where (text, image) tuples are appended to be sent
+            priority (int): send_q priority class of the crops
+        """
+        for x1, y1, x2, y2 in regions:
+            crop = np.ascontiguousarray(image[y1:y2, x1:x2])
+            if priority == CONTINUOUS and not (
+                    self.continuous_limiter is None
+                    or self.continuous_limiter.allow(crop)):
+                continue
+            text = '|'.join([camera.text, state,
+                             '({},{}),({},{})'.format(x1, y1, x2, y2)])
+            send_q.append((text, crop), priority)
+
+    def update_idle(self, state):
+        """ Start or stop idling, from the state of the frame just detected
+
+        A frame state that differs from current_state is a candidate state
+        change, e.g., a 'moving' frame while 'still', so the detector stops
+        idling and detects every frame again. min_frames, min_motion_frames and
+        min_still_frames then count consecutive frames, as usual. Once every
+        frame detected for idle_after seconds has matched current_state, the
+        detector idles: it detects only every idle_every_nth frame.
+
+        Parameters:
+            state (str): state of the frame just detected, e.g., 'moving'
+        """
+        if self.idle_after is None:
+            return
+        now = perf_counter()
+        if state != self.current_state:
+            self.stable_since = now
+            self.idle = False
+        elif not self.idle and now - self.stable_since >= self.idle_after:
+            self.idle = True
+            self.idle_frames = 0
+
+    def skip_frame(self):
+        """ True if the detector is idle and the current frame isn't its Nth
+        """
+        if not self.idle:
+            return False
+        self.idle_frames += 1
+        return self.idle_frames % self.idle_every_nth != 0
+
+    def provably_still(self, thresholded):
+        """ True if no contour of thresholded can be large enough for motion
+
+        The 'fast' motion_scoring check, which skips findContours() and the
+        contour area loop for most frames without motion. A contour runs
+        through the centers of the edge pixels of its blob, so its area is at
+        most (width - 1) * (height - 1) of the bounding box of all the motion
+        pixels. If that is less than min_area_pixels, the frame is 'still',
+        exactly as if every contour area had been compared.
+
+        Parameters:
+            thresholded (OpenCV image): dilated thresholded frameDelta
+        """
+        if cv2.countNonZero(thresholded) == 0:
+            return True
+        x, y, width, height = cv2.boundingRect(thresholded)
+        return (width - 1) * (height - 1) < self.min_area_pixels
+
     def send_test_data(self, images, state_values, send_q):
         """ Sends various test data, images, computed state values via send_q
 
@@ -1304,7 +2510,7 @@ class Detector:
                 as state, area, N_contours, Mean Pixel Value, etc.
         """
         for text_and_image in images:
-            send_q.append(text_and_image)
+            send_q.append(text_and_image, CONTINUOUS)
         font = cv2.FONT_HERSHEY_SIMPLEX
         for text_and_value in state_values:
             text, value = text_and_value
@@ -1312,7 +2518,7 @@ class Detector:
             cv2.putText(state_image, value, (10, 35), font,
                         1, (255, 255, 255), 2, cv2.LINE_AA)
             text_and_image = (text, state_image)
-            send_q.append(text_and_image)
+            send_q.append(text_and_image, CONTINUOUS)
 
 
 class Settings:
@@ -1383,6 +2589,78 @@ class Settings:
             self.send_threading = self.config['node']['send_threading']
         else:
             self.send_threading = False
+        if 'jpeg_quality' in self.config['node']:
+            self.jpeg_quality = self.config['node']['jpeg_quality']
+        else:
+            self.jpeg_quality = 95
+        if 'jpeg_quality_min' in self.config['node']:
+            self.jpeg_quality_min = self.config['node']['jpeg_quality_min']
+        else:
+            self.jpeg_quality_min = 50
+        if 'send_bandwidth' in self.config['node']:
+            self.send_bandwidth = self.config['node']['send_bandwidth']
+        else:
+            self.send_bandwidth = None
+        if 'send_frame_ms' in self.config['node']:
+            self.send_frame_ms = self.config['node']['send_frame_ms']
+        else:
+            self.send_frame_ms = None
+        if 'continuous_fps' in self.config['node']:
+            self.continuous_fps = self.config['node']['continuous_fps']
+        else:
+            self.continuous_fps = None
+        if 'continuous_bandwidth' in self.config['node']:
+            self.continuous_bandwidth = self.config['node']['continuous_bandwidth']
+        else:
+            self.continuous_bandwidth = None
+        if 'continuous_every_nth' in self.config['node']:
+            self.continuous_every_nth = self.config['node']['continuous_every_nth']
+        else:
+            self.continuous_every_nth = 1
+        if 'send_q_overflow' in self.config['node']:
+            self.send_q_overflow = self.config['node']['send_q_overflow']
+        else:
+            self.send_q_overflow = 'drop_oldest'
+        if self.send_q_overflow not in OVERFLOW_POLICIES:
+            raise ValueError('Unknown send_q_overflow: {}; use one of {}'.format(
+                self.send_q_overflow, ', '.join(OVERFLOW_POLICIES)))
+        if 'send_q_timeout' in self.config['node']:
+            self.send_q_timeout = self.config['node']['send_q_timeout']
+        else:
+            self.send_q_timeout = 1.0  # seconds to wait with 'block' policy
+        if 'send_q_decimate' in self.config['node']:
+            self.send_q_decimate = self.config['node']['send_q_decimate']
+        else:
+            self.send_q_decimate = 2  # keep every 2nd message when send_q full
+        if 'heartbeat_stats' in self.config['node']:
+            self.heartbeat_stats = self.config['node']['heartbeat_stats']
+        else:
+            self.heartbeat_stats = False
+        if 'encode_threads' in self.config['node']:
+            self.encode_threads = self.config['node']['encode_threads']
+        else:
+            self.encode_threads = 0
+        if 'send_priority' in self.config['node']:
+            self.send_priority = self.config['node']['send_priority']
+        else:
+            self.send_priority = False
+        if 'send_q_capacities' in self.config['node']:
+            # dict of maximum messages per priority class, e.g., {'event': 20}
+            self.send_q_capacities = self.config['node']['send_q_capacities']
+        else:
+            self.send_q_capacities = None
+        if 'camera_processes' in self.config['node']:
+            self.camera_processes = self.config['node']['camera_processes']
+        else:
+            self.camera_processes = False
+        if 'ring_slots' in self.config['node']:
+            self.ring_slots = self.config['node']['ring_slots']
+        else:
+            self.ring_slots = self.queuemax + 10  # cam_q must fit in the ring
+        if 'camera_threading' in self.config['node']:
+            self.camera_threading = self.config['node']['camera_threading']
+        else:
+            self.camera_threading = False
         if 'send_type' in self.config['node']:
             self.send_type = self.config['node']['send_type']
         else:
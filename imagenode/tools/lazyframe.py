@@ -0,0 +1,145 @@
+"""lazyframe: a captured frame that is flipped and resized only when needed
+
+Most frames read from a camera are never sent: with send_frames set to
+'detected event', frames are only sent when a detector state changes. But the
+detectors only need their ROI of each frame. A LazyFrame holds the frame as
+read from the camera and does the camera vflip and resize_width transforms of
+the whole frame only if the whole frame is needed, e.g., to send it. Slicing a
+LazyFrame, e.g. frame[y1:y2, x1:x2], returns that ROI of the transformed frame
+by mapping it to the raw frame and transforming just the ROI. The whole
+transformed frame can be written into a buffer from a BufferPool instead of a
+newly allocated image.
+
+Copyright (c) 2017 by Jeff Bass.
+License: MIT, see LICENSE for more details.
+"""
+
+import math
+import cv2
+import numpy as np
+
+
+class LazyFrame:
+    """ A camera frame with vflip and resize transforms that are done lazily
+
+    Parameters:
+        raw (OpenCV image): frame as read from the camera
+        vflip (bool): True if the frame is to be flipped (cv2.flip(frame, -1))
+        size (tuple): (width, height) after resizing, or None to not resize
+        pool (BufferPool): where the whole transformed frame's buffer comes
+            from, or None to allocate it
+    """
+
+    def __init__(self, raw, vflip=False, size=None, pool=None):
+        self.raw = raw
+        self.vflip = vflip
+        self.pool = pool
+        raw_height, raw_width = raw.shape[:2]
+        if size is None or tuple(size) == (raw_width, raw_height):
+            self.size = None
+            width, height = raw_width, raw_height
+        else:
+            self.size = tuple(size)
+            width, height = self.size
+        self.shape = (height, width) + raw.shape[2:]
+        self.scale_x = raw_width / width
+        self.scale_y = raw_height / height
+        self.transformed = None
+
+    def image(self):
+        """ Return the whole transformed frame, transforming it only once
+        """
+        if self.transformed is None:
+            dst = None
+            if self.pool is not None:
+                dst = self.pool.get(self.shape, self.raw.dtype)
+            self.transformed = self.transform(self.raw, self.shape[1],
+                                              self.shape[0], dst)
+        return self.transformed
+
+    def transform(self, raw, width, height, dst=None):
+        """ Return raw resized to (width, height) and flipped, into dst if set
+        """
+        if self.size is not None:
+            raw = cv2.resize(raw, (width, height), dst=dst,
+                             interpolation=cv2.INTER_AREA)
+            if self.vflip:  # flip the resized image in place
+                raw = cv2.flip(raw, -1, dst=raw)
+        elif self.vflip:
+            raw = cv2.flip(raw, -1, dst=dst)
+        return raw
+
+    def __getitem__(self, key):
+        """ Return the ROI frame[rows, columns] of the transformed frame
+
+        Only a (rows slice, columns slice) key is supported. If the whole frame
+        has already been transformed, the ROI is a view of it. Otherwise, only
+        the matching part of the raw frame is transformed. So that the ROI has
+        exactly the pixels it has in the whole transformed frame, the part of
+        the raw frame that is resized starts and ends at raw pixel boundaries
+        that are also resized pixel boundaries (see aligned()); resizing it
+        then weighs each raw pixel just as resizing the whole frame does. If
+        the only aligned part is the whole frame, the whole frame is
+        transformed.
+        """
+        if self.transformed is not None:
+            return self.transformed[key]
+        rows, columns = key
+        height, width = self.shape[:2]
+        y1, y2, _ = rows.indices(height)
+        x1, x2, _ = columns.indices(width)
+        if self.vflip:  # flip -1 flips both axes
+            x1, x2 = width - x2, width - x1
+            y1, y2 = height - y2, height - y1
+        if x2 <= x1 or y2 <= y1:  # empty, shaped like the slice would be
+            return np.empty((max(0, y2 - y1), max(0, x2 - x1)) + self.shape[2:],
+                            self.raw.dtype)
+        if self.size is None:
+            roi = self.raw[y1:y2, x1:x2]
+        else:
+            raw_height, raw_width = self.raw.shape[:2]
+            ax1, ax2 = aligned(x1, x2, width, raw_width)
+            ay1, ay2 = aligned(y1, y2, height, raw_height)
+            if (ax2 - ax1) * (ay2 - ay1) == width * height:
+                return self.image()[key]  # no smaller aligned part
+            raw_roi = self.raw[ay1 * raw_height // height:
+                               ay2 * raw_height // height,
+                               ax1 * raw_width // width:
+                               ax2 * raw_width // width]
+            roi = cv2.resize(raw_roi, (ax2 - ax1, ay2 - ay1),
+                             interpolation=cv2.INTER_AREA)
+            roi = roi[y1 - ay1:y2 - ay1, x1 - ax1:x2 - ax1]
+        if self.vflip:
+            roi = cv2.flip(roi, -1)
+        return roi
+
+
+def aligned(start, stop, size, raw_size):
+    """ Return the smallest aligned (start, stop) that contains start:stop
+
+    A resized position is aligned when it falls on a raw pixel boundary,
+    i.e., position * raw_size / size is an integer. Aligned positions are the
+    multiples of size // gcd(size, raw_size), e.g., every position when
+    halving, every 43rd when resizing 640 pixels to 172.
+
+    Parameters:
+        start, stop (int): resized pixel range
+        size (int): resized width or height
+        raw_size (int): raw width or height
+    """
+    step = size // math.gcd(size, raw_size)
+    return start // step * step, min(size, -(-stop // step) * step)
+
+
+def as_image(frame):
+    """ Return frame as an OpenCV image; a LazyFrame is transformed
+
+    A StoredFrame from a FrameHistory cam_q (see tools/framehistory.py) is
+    decoded or returned downscaled.
+
+    Parameters:
+        frame (OpenCV image, LazyFrame or StoredFrame): a camera frame
+    """
+    if isinstance(frame, np.ndarray):
+        return frame
+    return frame.image()
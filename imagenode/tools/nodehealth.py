@@ -17,6 +17,7 @@ import numpy as np
 from time import sleep
 from datetime import datetime
 from tools.utils import interval_timer
+from tools.queues import CONTROL
 
 class HealthMonitor:
     """ Methods and attributes to measure and tune network and system stability
@@ -44,6 +45,7 @@ class HealthMonitor:
                               / (1024.0*1024.0)))  # = MB
         self.tiny_image = np.zeros((3,3), dtype="uint8")  # tiny blank image
         self.heartbeat_event_text = '|'.join([settings.nodename, 'Heartbeat'])
+        self.stats_queues = []  # (name, queue) to add counts to heartbeat
         self.patience = settings.patience
         if settings.heartbeat:
             threading.Thread(daemon=True,
@@ -59,10 +61,15 @@ class HealthMonitor:
 
     def send_heartbeat(self):
         """ send a heartbeat message to imagehub
+
+        If the heartbeat_stats option is True, the enqueued, dropped and high
+        water counts of the send_q and each cam_q are appended to the message.
         """
         text = self.heartbeat_event_text
+        for name, q in self.stats_queues:
+            text = '|'.join([text, name + ' ' + q.stats_text()])
         text_and_image = (text, self.tiny_image)
-        self.send_q.append(text_and_image)
+        self.send_q.append(text_and_image, CONTROL)
 
     def stall_watcher(self, pid, patience):
         """ Watch the main process cpu_times.user; sys.exit() if not advancing
@@ -0,0 +1,219 @@
+"""queues: send_q and cam_q queue classes with overflow policies
+
+The send_q holds (text, image) messages waiting to be sent to the imagehub and
+the cam_q of each camera holds its most recent images. Both have a maximum
+length. What happens when a full queue is appended to is set by an overflow
+policy, one of:
+
+    'drop_oldest': drop the oldest item to make room (like deque(maxlen))
+    'drop_newest': drop the new item
+    'block': wait up to timeout seconds for room, then drop the oldest item
+    'decimate': keep only every Nth new item (dropping the oldest to make
+                room for it) and drop the others, until there is room again
+
+Each queue counts the items enqueued and dropped and its high water mark
+(greatest length), so queuemax can be sized from data.
+
+Copyright (c) 2017 by Jeff Bass.
+License: MIT, see LICENSE for more details.
+"""
+
+import threading
+from collections import deque
+
+# send_q message priority classes, from highest to lowest priority
+CONTROL = 0  # restart and heartbeat messages
+EVENT = 1  # detector event messages, e.g. 'JeffOffice Window|motion|moving'
+SENSOR = 2  # sensor readings, e.g. temperature and humidity
+EVENT_IMAGE = 3  # images sent because of a detected event
+CONTINUOUS = 4  # images sent continuously, and detector test images
+PRIORITY_NAMES = ('control', 'event', 'sensor', 'event_image', 'continuous')
+
+OVERFLOW_POLICIES = ('drop_oldest', 'drop_newest', 'block', 'decimate')
+# a cam_q is never emptied by a consumer, so only a policy that keeps its
+# newest images makes sense for it
+CAM_Q_OVERFLOW_POLICIES = ('drop_oldest', 'decimate')
+
+
+class QueueStats:
+    """ Counts of items enqueued and dropped and the high water mark of a queue
+    """
+
+    def __init__(self):
+        self.enqueued = 0
+        self.dropped = 0
+        self.high_water = 0
+
+    def stats_text(self):
+        """ Return the counts as text, e.g. for a heartbeat message
+        """
+        return 'enqueued={} dropped={} high_water={}'.format(
+            self.enqueued, self.dropped, self.high_water)
+
+
+class OverflowDeque(QueueStats):
+    """ A deque(maxlen=maxlen) replacement for cam_q with an overflow policy
+
+    Supports the deque methods used with cam_q: append(), len(), indexing and
+    clear(). Since frames are never removed from a cam_q, only a newer frame
+    can make room. 'drop_newest' would keep the first maxlen frames forever
+    and 'block' would never get room, so neither is a cam_q policy.
+
+    Parameters:
+        maxlen (int): maximum number of items
+        overflow (str): overflow policy, one of CAM_Q_OVERFLOW_POLICIES
+        decimate (int): N for the 'decimate' overflow policy
+    """
+
+    def __init__(self, maxlen=50, overflow='drop_oldest', decimate=2):
+        super().__init__()
+        self.q = deque(maxlen=maxlen)
+        self.maxlen = maxlen
+        self.overflow = overflow
+        self.decimate = decimate
+        self.overflow_count = 0  # items appended while full, for 'decimate'
+
+    def __len__(self):
+        return len(self.q)
+
+    def __getitem__(self, i):
+        return self.q[i]
+
+    def __iter__(self):
+        return iter(self.q)
+
+    def append(self, item):
+        """ Append item; return True, or False if the overflow policy dropped it
+        """
+        if len(self.q) >= self.maxlen:
+            self.overflow_count += 1
+            if (self.overflow == 'decimate'
+                    and self.overflow_count % self.decimate):
+                self.dropped += 1
+                return False
+            self.dropped += 1  # the deque drops its oldest item
+        else:
+            self.overflow_count = 0
+        self.q.append(item)
+        self.enqueued += 1
+        self.high_water = max(self.high_water, len(self.q))
+        return True
+
+    def clear(self):
+        self.q.clear()
+
+
+class PriorityDeque(QueueStats):
+    """ A deque of (text, image) messages that pops higher priorities first
+
+    Each priority class has its own FIFO deque with its own capacity. popleft()
+    returns the oldest message of the highest priority class that has one.
+    When a class is at its capacity, its oldest message is dropped to make
+    room. When the PriorityDeque is at maxlen, the overflow policy applies.
+    With the 'drop_oldest' policy, the oldest message of the lowest priority
+    class is dropped to make room, unless the new message is of a lower
+    priority class than every queued message; then the new message is dropped.
+    The other policies also never drop a message to make room for a message of
+    a lower priority class. So event messages never wait behind, or get
+    dropped because of, continuously sent images.
+
+    If use_priority is False, every message is put into the same class, so the
+    PriorityDeque behaves exactly like a deque(maxlen=maxlen) with the overflow
+    policy.
+
+    append() and popleft() are thread safe, as they are for a deque. The
+    'block' overflow policy is only useful when messages are sent by another
+    thread (see send_threading), since only popleft() can make room.
+
+    Parameters:
+        maxlen (int): maximum number of messages in all classes
+        capacities (dict): maximum messages per class, by PRIORITY_NAMES name;
+            each class not in capacities is only limited by maxlen
+        use_priority (bool): False to ignore priority and be a simple deque
+        overflow (str): overflow policy, one of OVERFLOW_POLICIES
+        timeout (float): seconds to wait for room with the 'block' policy
+        decimate (int): N for the 'decimate' overflow policy
+    """
+
+    def __init__(self, maxlen=500, capacities=None, use_priority=True,
+                 overflow='drop_oldest', timeout=1.0, decimate=2):
+        super().__init__()
+        self.maxlen = maxlen
+        self.use_priority = use_priority
+        capacities = capacities if (capacities and use_priority) else {}
+        self.capacities = [capacities.get(name) for name in PRIORITY_NAMES]
+        self.qs = [deque() for name in PRIORITY_NAMES]
+        self.length = 0
+        self.class_dropped = [0 for name in PRIORITY_NAMES]
+        self.overflow = overflow
+        self.timeout = timeout
+        self.decimate = decimate
+        self.overflow_count = 0  # messages appended while full, for 'decimate'
+        self.not_full = threading.Condition()
+
+    def __len__(self):
+        return self.length
+
+    def __bool__(self):
+        return self.length > 0
+
+    def drop(self, priority):
+        self.class_dropped[priority] += 1
+        self.dropped += 1
+
+    def append(self, text_and_image, priority=CONTINUOUS):
+        """ Append a (text, image) message of a priority class
+
+        Parameters:
+            text_and_image (tuple): (text, image) message to send
+            priority (int): priority class, e.g. EVENT; default is CONTINUOUS
+        """
+        if not self.use_priority:
+            priority = CONTINUOUS
+        with self.not_full:
+            q = self.qs[priority]
+            capacity = self.capacities[priority]
+            if capacity is not None and len(q) >= capacity:
+                q.popleft()  # class at capacity; drop its oldest message
+                self.drop(priority)
+                self.length -= 1
+            if self.length >= self.maxlen and self.overflow == 'block':
+                self.not_full.wait_for(lambda: self.length < self.maxlen,
+                                       timeout=self.timeout)
+            if self.length >= self.maxlen:
+                self.overflow_count += 1
+                lowest = max(p for p, pq in enumerate(self.qs) if pq)
+                if lowest < priority or (
+                        lowest == priority and (
+                            self.overflow == 'drop_newest' or (
+                                self.overflow == 'decimate'
+                                and self.overflow_count % self.decimate))):
+                    self.drop(priority)  # drop the new message
+                    return
+                self.qs[lowest].popleft()
+                self.drop(lowest)
+                self.length -= 1
+            else:
+                self.overflow_count = 0
+            q.append(text_and_image)
+            self.length += 1
+            self.enqueued += 1
+            self.high_water = max(self.high_water, self.length)
+
+    def popleft(self):
+        """ Remove and return the oldest message of the highest priority class
+        """
+        with self.not_full:
+            for q in self.qs:
+                if q:
+                    self.length -= 1
+                    self.not_full.notify()
+                    return q.popleft()
+        raise IndexError('pop from an empty PriorityDeque')
+
+    def clear(self):
+        with self.not_full:
+            for q in self.qs:
+                q.clear()
+            self.length = 0
+            self.not_full.notify_all()
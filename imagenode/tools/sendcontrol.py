@@ -0,0 +1,177 @@
+"""sendcontrol: classes that control how much the imagenode sends
+
+Bandwidth is often the limiting factor for imagenodes on a farm WiFi network.
+The QualityController adjusts the jpg quality of sent images to keep the
+imagenode within a bandwidth budget. The RateLimiter limits the rate of
+images sent continuously by a detector, a camera or the whole imagenode.
+
+Copyright (c) 2017 by Jeff Bass.
+License: MIT, see LICENSE for more details.
+"""
+
+import threading
+from time import perf_counter
+
+
+class QualityController:
+    """ Adjusts jpg quality to keep sending within a bandwidth budget
+
+    The size of each jpg sent and the time from its REQ to the hub REP are
+    measured. At the end of each interval, if the bytes sent per second or the
+    average milliseconds per frame were over budget, the quality is lowered by
+    2 steps for each multiple of the budget used, so quality drops quickly when
+    the link degrades. If both were under 80% of budget, there is headroom and
+    the quality is raised by 1 step. Quality is kept between min_quality and
+    max_quality.
+
+    Parameters:
+        max_bytes_per_sec (int): budget of jpg bytes sent per second, or None
+        max_ms_per_frame (float): budget of milliseconds per REQ / REP, or None
+        min_quality (int): lowest jpg quality to use
+        max_quality (int): highest jpg quality to use; quality starts here
+        interval (float): seconds between quality adjustments
+        step (int): amount quality is raised or lowered by each step
+    """
+
+    def __init__(self, max_bytes_per_sec=None, max_ms_per_frame=None,
+                 min_quality=50, max_quality=95, interval=1.0, step=5):
+        self.max_bytes_per_sec = max_bytes_per_sec
+        self.max_ms_per_frame = max_ms_per_frame
+        self.min_quality = min_quality
+        self.max_quality = max_quality
+        self.interval = interval
+        self.step = step
+        self.quality = max_quality
+        self.bytes_per_sec = 0.0  # measured in the last interval
+        self.ms_per_frame = 0.0  # measured in the last interval
+        self.start_interval(perf_counter())
+
+    def start_interval(self, now):
+        self.interval_start = now
+        self.interval_bytes = 0
+        self.interval_frames = 0
+        self.interval_seconds = 0.0  # total REQ / REP time of the frames
+
+    def update(self, nbytes, seconds):
+        """ Record a sent jpg and return the jpg quality to use next
+
+        Parameters:
+            nbytes (int): size of the jpg sent
+            seconds (float): time from sending the jpg to receiving the REP
+        """
+        self.interval_bytes += nbytes
+        self.interval_frames += 1
+        self.interval_seconds += seconds
+        now = perf_counter()
+        elapsed = now - self.interval_start
+        if elapsed < self.interval:
+            return self.quality
+        self.bytes_per_sec = self.interval_bytes / elapsed
+        self.ms_per_frame = 1000 * self.interval_seconds / self.interval_frames
+        self.start_interval(now)
+        usage = 0.0  # greatest fraction of a budget used
+        if self.max_bytes_per_sec:
+            usage = self.bytes_per_sec / self.max_bytes_per_sec
+        if self.max_ms_per_frame:
+            usage = max(usage, self.ms_per_frame / self.max_ms_per_frame)
+        if usage > 1.0:
+            self.quality -= 2 * self.step * int(usage + 0.5)
+        elif usage < 0.8:
+            self.quality += self.step
+        self.quality = max(self.min_quality, min(self.max_quality, self.quality))
+        return self.quality
+
+    def stats_text(self):
+        """ Return the quality and measurements as text, e.g. for a heartbeat
+        """
+        return 'quality={} bytes_per_sec={:.0f} ms_per_frame={:.1f}'.format(
+            self.quality, self.bytes_per_sec, self.ms_per_frame)
+
+
+class RateLimiter:
+    """ Token buckets limiting the rate of images sent continuously
+
+    With send_frames: continuous, a detector appends every captured image to
+    the send_q, whatever the network can carry. A RateLimiter lets an image
+    be sent only if there is a frame token and enough byte tokens for it in
+    its buckets. Each bucket is refilled at max_fps frames or
+    max_bytes_per_sec bytes per second and holds at most 1 second of them.
+    With every_nth, only every Nth image offered is considered at all; this
+    is only useful for a RateLimiter that is offered the images of one
+    detector, since the images of several detectors interleave.
+
+    A RateLimiter can have a parent, e.g., a detector's RateLimiter can have
+    its camera's RateLimiter as parent, which can have the node's RateLimiter
+    as parent. An image is only allowed if every RateLimiter in the chain has
+    room for it, and then it uses tokens from each of them. Each RateLimiter
+    counts the images it throttled.
+
+    The jpg size of an image isn't known until it is compressed, so it is
+    estimated as image.nbytes times the jpg_ratio, which is the measured ratio
+    of recent jpg sizes to image sizes.
+
+    Parameters:
+        max_fps (float): maximum images per second, or None for no limit
+        max_bytes_per_sec (int): maximum jpg bytes per second, or None
+        every_nth (int): consider only every Nth image offered
+    """
+
+    lock = threading.Lock()  # one lock for every chain of RateLimiters
+
+    def __init__(self, max_fps=None, max_bytes_per_sec=None, every_nth=1):
+        self.max_fps = max_fps
+        self.max_bytes_per_sec = max_bytes_per_sec
+        self.every_nth = every_nth
+        self.parent = None
+        self.jpg_ratio = None  # multiprocessing.Value set by the ImageNode
+        self.frame_tokens = max_fps or 0
+        self.byte_tokens = max_bytes_per_sec or 0
+        self.last_refill = perf_counter()
+        self.offered = 0
+        self.throttled = 0
+
+    def allow(self, image):
+        """ Return True if image may be sent now, using tokens if it may
+
+        Parameters:
+            image (OpenCV image): image a detector would append to the send_q
+        """
+        nbytes = image.nbytes * (self.jpg_ratio.value if self.jpg_ratio else 1.0)
+        with RateLimiter.lock:
+            limiters = []
+            limiter = self
+            while limiter:
+                if not limiter.has_room(nbytes):
+                    limiter.throttled += 1
+                    return False
+                limiters.append(limiter)
+                limiter = limiter.parent
+            for limiter in limiters:
+                limiter.frame_tokens -= 1
+                limiter.byte_tokens -= nbytes
+            return True
+
+    def has_room(self, nbytes):
+        now = perf_counter()
+        elapsed = now - self.last_refill
+        self.last_refill = now
+        if self.max_fps:
+            self.frame_tokens = min(max(self.max_fps, 1),
+                                    self.frame_tokens + elapsed * self.max_fps)
+        if self.max_bytes_per_sec:
+            self.byte_tokens = min(self.max_bytes_per_sec,
+                self.byte_tokens + elapsed * self.max_bytes_per_sec)
+        self.offered += 1
+        if self.every_nth > 1 and self.offered % self.every_nth:
+            return False
+        if self.max_fps and self.frame_tokens < 1:
+            return False
+        if self.max_bytes_per_sec and (
+                self.byte_tokens < min(nbytes, self.max_bytes_per_sec)):
+            return False
+        return True
+
+    def stats_text(self):
+        """ Return the throttled count as text, e.g. for a heartbeat message
+        """
+        return 'offered={} throttled={}'.format(self.offered, self.throttled)
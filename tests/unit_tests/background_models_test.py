@@ -0,0 +1,113 @@
+"""background_models_test.py -- compare the motion detector background models
+
+The background_model option of a motion detector chooses how the motion
+pixels of each ROI image are found (see tools/background.py). This test
+program runs each background model over the same frames, with the motion
+detector's blur, dilate and min_area steps, and prints for each one:
+
+    the mean time per frame of the background model step
+    the percent of frames with motion (a contour of at least min_area)
+
+Run it with a replay source (an image directory, a video file or a frame
+archive recorded with the camera 'record' option) of footage without motion
+in it, e.g., of a scene with lighting flicker, and the percent of frames with
+motion is the false positive rate of each model:
+
+    python background_models_test.py ~/imagenode_data/barn_night.frames
+
+Run it without a replay source to use synthetic footage: a noisy scene with
+lighting flicker, followed by the same scene with a square moving across it.
+It prints the percent of frames with motion for each part: false positives
+for the first part and detections for the second.
+"""
+
+import os
+import sys
+import time
+import cv2
+import numpy as np
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..',
+                                'imagenode'))
+from tools.background import BACKGROUND_MODELS, background_model
+from tools.imaging import ReplayStream
+
+NUM_FRAMES = 300  # How many synthetic frames in each part
+SHAPE = (240, 320)  # Synthetic frame shape
+FLICKER = 8  # Synthetic lighting flicker, up to this many gray levels
+DELTA_THRESHOLD = 5  # motion detector settings
+MIN_AREA = 3  # in percent of the frame
+BLUR_KERNEL_SIZE = 15
+
+def synthetic_frames():
+    """ Return the still and moving parts of some synthetic footage
+    """
+    rng = np.random.default_rng(0)
+    scene = cv2.GaussianBlur(rng.integers(0, 255, SHAPE, dtype=np.uint8),
+                             (31, 31), 0)
+    still, moving = [], []
+    for i in range(NUM_FRAMES):
+        flicker = int(rng.integers(-FLICKER, FLICKER + 1))
+        noise = rng.normal(0, 2, SHAPE)
+        frame = np.clip(scene.astype(np.float32) + flicker + noise, 0, 255)
+        still.append(cv2.cvtColor(frame.astype(np.uint8), cv2.COLOR_GRAY2BGR))
+        frame = frame.astype(np.uint8)
+        x = (i * 6) % (SHAPE[1] - 60)  # 6 pixels per frame
+        frame[90:150, x:x + 60] = 255
+        moving.append(cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR))
+    return still, moving
+
+def replay_frames(src):
+    """ Return the frames of a replay source as a single part
+    """
+    replay = ReplayStream(src)
+    frames = []
+    frame = replay.next_frame()
+    while frame is not None:
+        frames.append(np.array(frame))
+        frame = replay.next_frame()
+    return [frames]
+
+def run_model(name, parts):
+    """ Return the model seconds per frame and percent moving of each part
+    """
+    model = background_model(name, DELTA_THRESHOLD)
+    seconds = 0.0
+    frames = 0
+    percents = []
+    for part in parts:
+        moving = 0
+        for image in part:
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            gray = cv2.GaussianBlur(gray, (BLUR_KERNEL_SIZE, BLUR_KERNEL_SIZE),
+                                    0)
+            min_area_pixels = gray.size * MIN_AREA // 100
+            start = time.perf_counter()
+            frame_delta, thresholded = model.apply(gray)
+            seconds += time.perf_counter() - start
+            frames += 1
+            dilated = cv2.dilate(thresholded, None, iterations=2)
+            contours = cv2.findContours(dilated, cv2.RETR_EXTERNAL,
+                                        cv2.CHAIN_APPROX_SIMPLE)[-2]
+            if any(cv2.contourArea(c) >= min_area_pixels for c in contours):
+                moving += 1
+        percents.append(100 * moving / len(part))
+    return seconds / frames, percents
+
+if len(sys.argv) > 1:
+    parts = replay_frames(sys.argv[1])
+    part_names = ['Frames with motion']
+else:
+    parts = synthetic_frames()
+    part_names = ['False positives (flicker)', 'Detections (moving square)']
+print('Background Models Test Program: ', __file__)
+print('Option settings:')
+print('    Frames: {:,} of shape {}'.format(sum(len(part) for part in parts),
+                                           parts[0][0].shape))
+print('    delta_threshold: {}, min_area: {}%, blur_kernel_size: {}'.format(
+    DELTA_THRESHOLD, MIN_AREA, BLUR_KERNEL_SIZE))
+for name in BACKGROUND_MODELS:
+    seconds, percents = run_model(name, parts)
+    print(name + ':')
+    print('    Mean time per frame: {:.3f} ms'.format(1000 * seconds))
+    for part_name, percent in zip(part_names, percents):
+        print('    {}: {:.1f}%'.format(part_name, percent))
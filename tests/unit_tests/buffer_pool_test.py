@@ -0,0 +1,99 @@
+"""buffer_pool_test.py -- time transforming frames with and without a BufferPool
+
+When a camera has vflip or resize_width set and a whole frame is needed, e.g.,
+to send it, the frame is resized and flipped into a new full size image. With
+a BufferPool, it is written into a reused buffer instead (see
+tools/bufferpool.py). This test program runs NUM_FRAMES frames through the
+same steps both ways: resize and flip each frame, append it to a cam_q of
+QUEUEMAX frames and keep it in a jpg EncodeCache sized like the imagenode's.
+Each way runs in its own process, so each one's peak RSS is its own.
+
+For each way, it prints the mean time per frame, the number of new full size
+images allocated per frame after the first QUEUEMAX frames, and the peak RSS
+of the process.
+
+It first checks that the pool never hands out a buffer that is still held:
+buffers, and views of them, are kept in a deque like a cam_q and a send_q
+while new buffers are taken from the pool, and any held buffer returned by
+the pool is an error.
+"""
+
+import os
+import sys
+import time
+import resource
+import multiprocessing
+from collections import deque
+import numpy as np
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..',
+                                'imagenode'))
+from tools.lazyframe import LazyFrame
+from tools.bufferpool import BufferPool
+from tools.encodecache import EncodeCache
+
+NUM_FRAMES = 2000  # How many frames to transform for each test
+SHAPE = (960, 1280, 3)  # Raw frame shape; try (480, 640, 3) and (1080, 1920, 3)
+SIZE = (640, 480)  # (width, height) after resize_width
+QUEUEMAX = 50  # Length of the cam_q and of the EncodeCache
+
+def check_held_buffers():
+    """ Return the number of times a held buffer was handed out again
+    """
+    pool = BufferPool(size=2 * QUEUEMAX + 4)
+    cam_q = deque(maxlen=QUEUEMAX)
+    send_q = deque(maxlen=QUEUEMAX // 2)
+    reused_held = 0
+    for i in range(NUM_FRAMES):
+        buf = pool.get(SIZE[::-1] + (3,))
+        held = [id(b) for b in cam_q] + [id(v.base) for v in send_q]
+        if id(buf) in held:
+            reused_held += 1
+        buf[:] = i % 255  # overwrite it, as a resize into it would
+        cam_q.append(buf)
+        if i % 3 == 0:
+            send_q.append(buf[10:20, 10:20])  # a view, like an ROI crop
+        del buf
+    return reused_held, pool
+
+def run(use_pool, results):
+    raw = np.random.randint(0, 255, SHAPE, dtype=np.uint8)
+    pool = BufferPool(size=2 * QUEUEMAX + 4) if use_pool else None
+    cam_q = deque(maxlen=QUEUEMAX)
+    jpg_cache = EncodeCache(encode=lambda image, quality: b'jpg',
+                            maxlen=QUEUEMAX)
+    seen = set()
+    new_images = 0
+    start = time.perf_counter()
+    for i in range(NUM_FRAMES):
+        frame = LazyFrame(raw, vflip=True, size=SIZE, pool=pool)
+        image = frame.image()
+        cam_q.append(image)
+        jpg_cache.get(image, 95)
+        if i >= QUEUEMAX and (not use_pool or id(image) not in seen):
+            new_images += 1
+        seen.add(id(image))
+    seconds = time.perf_counter() - start
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # KB on Linux
+    results.put((seconds, new_images / (NUM_FRAMES - QUEUEMAX), rss))
+
+print('Buffer Pool Test Program: ', __file__)
+print('Option settings:')
+print('    Raw frame shape: {}, resized to {}'.format(SHAPE, SIZE))
+print('    Requested Frames: {:,}, cam_q length {}'.format(NUM_FRAMES, QUEUEMAX))
+reused_held, pool = check_held_buffers()
+print('Held buffers check:')
+print('    Measured free reference count: {}'.format(pool.free_refcount))
+print('    Held buffers handed out again: {} ({})'.format(
+    reused_held, pool.stats_text()))
+assert reused_held == 0, 'BufferPool handed out a buffer that was still held'
+for name, use_pool in (('New image per frame', False), ('BufferPool', True)):
+    results = multiprocessing.Queue()
+    p = multiprocessing.Process(target=run, args=(use_pool, results))
+    p.start()
+    seconds, new_images, rss = results.get()
+    p.join()
+    print(name + ':')
+    print('    Mean time per frame: {:.3f} ms'.format(
+        1000 * seconds / NUM_FRAMES))
+    print('    New images per frame: {:.2f}'.format(new_images))
+    print('    Peak RSS: {:,} KB'.format(rss))
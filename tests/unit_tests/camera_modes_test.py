@@ -0,0 +1,151 @@
+"""camera_modes_test.py -- compare imagenode FPS and CPU in 3 process modes
+
+Runs imagenode.py end to end, with a camera 'replay' source replayed as fast
+as possible (replay_fps: 0) and a motion detector with send_frames:
+continuous, once in each of these modes:
+
+    single process: camera reading, detecting and sending in one thread
+    send_threading: sending in a separate thread
+    camera_processes: detecting and sending in separate processes
+
+Images are received by an imagezmq ImageHub in this program. For each mode,
+it prints the replay FPS (frames read by imagenode.py per second, from
+imagenode.log), the received FPS (images received by the hub per second) and
+the CPU time used by imagenode.py and its processes, in total and per frame.
+
+Run it with a replay source (an image directory, a video file or a frame
+archive recorded with the camera 'record' option):
+
+    python camera_modes_test.py ~/imagenode_data/barn_day.frames
+
+or without one to replay NUM_FRAMES synthetic frames with a moving square.
+"""
+
+import os
+import re
+import sys
+import time
+import resource
+import tempfile
+import threading
+import subprocess
+import cv2
+import numpy as np
+import imagezmq
+
+NUM_FRAMES = 600  # How many synthetic frames to replay
+SHAPE = (480, 640, 3)  # Synthetic frame shape
+PORT = 5588  # Port of the test hub
+IMAGENODE = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..',
+                                         'imagenode', 'imagenode.py'))
+MODES = (('single process', ''),
+         ('send_threading', '  send_threading: True\n'),
+         ('camera_processes', '  camera_processes: True\n'))
+YAML = """---
+node:
+  name: Modes
+  queuemax: 50
+  patience: 30
+  heartbeat: 60
+  send_type: jpg
+{mode}hub_address:
+  H1: tcp://127.0.0.1:{port}
+cameras:
+  P1:
+    viewname: test
+    replay: {replay}
+    replay_fps: 0
+    detectors:
+      motion:
+        ROI: (10,10),(90,90)
+        send_frames: continuous
+        delta_threshold: 5
+        min_motion_frames: 3
+        min_still_frames: 3
+        min_area: 3
+        blur_kernel_size: 15
+"""
+
+def synthetic_frames(directory):
+    """ Write NUM_FRAMES frames with a square moving across them
+    """
+    for i in range(NUM_FRAMES):
+        image = np.full(SHAPE, 60, dtype=np.uint8)
+        x = (i * 8) % (SHAPE[1] - 100)
+        cv2.rectangle(image, (x, 150), (x + 100, 300), (255, 255, 255), -1)
+        cv2.imwrite(os.path.join(directory, '{:05d}.png'.format(i)), image)
+
+class Hub(threading.Thread):
+    """ Receive and count images until stopped
+    """
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.hub = imagezmq.ImageHub(open_port='tcp://*:{}'.format(PORT))
+        self.images = 0
+        self.first = self.last = None
+        self.running = True
+
+    def reset(self):
+        self.images = 0
+        self.first = self.last = None
+
+    def run(self):
+        while self.running:
+            if not self.hub.zmq_socket.poll(100):
+                continue
+            text, jpg_buffer = self.hub.recv_jpg()
+            self.hub.send_reply(b'OK')
+            if '|jpg' in text:
+                self.last = time.perf_counter()
+                self.first = self.first or self.last
+                self.images += 1
+
+def run_mode(mode, replay, hub, directory):
+    """ Run imagenode.py in one mode; return replay FPS, received FPS and CPU
+    """
+    with open(os.path.join(directory, 'imagenode.yaml'), 'w') as f:
+        f.write(YAML.format(mode=mode, port=PORT, replay=replay))
+    log = os.path.join(directory, 'imagenode.log')
+    if os.path.exists(log):
+        os.remove(log)
+    hub.reset()
+    before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    subprocess.run([sys.executable, IMAGENODE], cwd=directory,
+                   env=dict(os.environ, HOME=directory),
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = ((after.ru_utime - before.ru_utime)
+           + (after.ru_stime - before.ru_stime))
+    with open(log) as f:
+        found = re.search(r'ended: (\d+) frames in [\d.]+ seconds = ([\d.]+) FPS',
+                          f.read())
+    frames, replay_fps = (int(found.group(1)), float(found.group(2))) if found \
+        else (0, 0.0)
+    received_fps = 0.0
+    if hub.images > 1:
+        received_fps = (hub.images - 1) / (hub.last - hub.first)
+    return frames, replay_fps, hub.images, received_fps, cpu
+
+with tempfile.TemporaryDirectory() as directory:
+    if len(sys.argv) > 1:
+        replay = os.path.abspath(os.path.expanduser(sys.argv[1]))
+    else:
+        replay = os.path.join(directory, 'frames')
+        os.mkdir(replay)
+        synthetic_frames(replay)
+    hub = Hub()
+    hub.start()
+    print('Camera Modes Test Program: ', __file__)
+    print('Option settings:')
+    print('    Replay source: {}'.format(replay))
+    for name, mode in MODES:
+        frames, replay_fps, images, received_fps, cpu = run_mode(
+            mode, replay, hub, directory)
+        print(name + ':')
+        print('    Replay FPS: {:.1f} ({:,} frames)'.format(replay_fps, frames))
+        print('    Received FPS: {:.1f} ({:,} images)'.format(received_fps,
+                                                             images))
+        print('    CPU time: {:.2f} s, {:.2f} ms per frame'.format(
+            cpu, 1000 * cpu / max(frames, 1)))
+    hub.running = False
+    hub.join()
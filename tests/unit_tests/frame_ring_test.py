@@ -0,0 +1,83 @@
+"""frame_ring_test.py -- time passing frames between processes 2 ways
+
+The camera_processes option passes frames from the camera capture process to
+the detector and sender processes through a FrameRing in shared memory. Only
+a small (slot, seq) tuple goes through a multiprocessing.Queue. This test
+program compares that with the simple alternative of putting each frame
+itself into a multiprocessing.Queue, which pickles and copies every frame.
+
+For each way, a producer (like the capture loop) sends NUM_FRAMES frames to a
+consumer process that computes the mean of each frame (a cheap stand in for a
+detector that reads every pixel). It computes and prints FPS statistics.
+
+To compare the camera_processes option with the single process and the
+send_threading options end to end, run camera_modes_test.py; it runs
+imagenode.py with a camera 'replay' source in each mode and prints the FPS
+and CPU time of each.
+"""
+
+import os
+import sys
+import time
+import multiprocessing
+import numpy as np
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..',
+                                'imagenode'))
+from tools.framering import FrameRing
+
+NUM_FRAMES = 2000  # How many frames to pass for each test
+SHAPE = (480, 640, 3)  # Frame shape; try (240, 320, 3) and (1080, 1920, 3)
+SLOTS = 60  # Number of FrameRing slots
+
+def pickled_consumer(q):
+    while True:
+        image = q.get()
+        if image is None:
+            break
+        image.mean()
+
+def ring_consumer(q, ring):
+    while True:
+        frame = q.get()
+        if frame is None:
+            break
+        slot, seq = frame
+        if ring.is_current(slot, seq):
+            ring.view(slot).mean()
+
+def time_pickled(image):
+    q = multiprocessing.Queue(maxsize=SLOTS // 2)
+    p = multiprocessing.Process(target=pickled_consumer, args=(q,))
+    p.start()
+    start = time.perf_counter()
+    for i in range(NUM_FRAMES):
+        q.put(image)
+    q.put(None)
+    p.join()
+    return time.perf_counter() - start
+
+def time_ring(image):
+    ring = FrameRing(SHAPE, SLOTS)
+    q = multiprocessing.Queue(maxsize=SLOTS // 2)
+    p = multiprocessing.Process(target=ring_consumer, args=(q, ring))
+    p.start()
+    start = time.perf_counter()
+    for i in range(NUM_FRAMES):
+        q.put(ring.write(image))
+    q.put(None)
+    p.join()
+    seconds = time.perf_counter() - start
+    ring.close()
+    ring.unlink()
+    return seconds
+
+image = np.random.randint(0, 255, SHAPE, dtype=np.uint8)
+print('Frame Ring Test Program: ', __file__)
+print('Option settings:')
+print('    Frame shape: {} = {:,} bytes'.format(SHAPE, image.nbytes))
+print('    Requested Frames: {:,}'.format(NUM_FRAMES))
+for name, timer in (('Pickled frames in Queue', time_pickled),
+                    ('FrameRing slot numbers', time_ring)):
+    seconds = timer(image)
+    print('{}: {:.2f} seconds; Approximate FPS: {:,.2f}'.format(
+        name, seconds, NUM_FRAMES / seconds))
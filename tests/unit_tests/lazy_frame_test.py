@@ -0,0 +1,61 @@
+"""lazy_frame_test.py -- check and time LazyFrame ROIs against eager transforms
+
+A LazyFrame (see tools/lazyframe.py) returns an ROI of a flipped and resized
+frame by transforming only the matching part of the raw frame. This test
+program checks that each ROI has exactly the pixels of the same ROI sliced
+from the whole transformed frame, for NUM_ROIS random ROIs at each of several
+resize_width percentages, with and without vflip. Then it times a detector
+sized ROI both ways.
+
+For each percentage, it prints the largest pixel difference (it must be 0)
+and the mean time per frame of the lazy ROI and of the eager transform.
+"""
+
+import os
+import sys
+import time
+import cv2
+import numpy as np
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..',
+                                'imagenode'))
+from tools.lazyframe import LazyFrame
+
+NUM_ROIS = 500  # How many random ROIs to check for each transform
+NUM_FRAMES = 200  # How many frames to time for each transform
+SHAPE = (1080, 1920, 3)  # Raw frame shape
+PERCENTS = (50, 33, 27, 25, 13)  # resize_width settings to check
+ROI = (slice(100, 200), slice(200, 400))  # timed ROI, in resized pixels
+
+rng = np.random.default_rng(0)
+raw = cv2.GaussianBlur(rng.integers(0, 255, SHAPE, dtype=np.uint8), (5, 5), 0)
+print('Lazy Frame Test Program: ', __file__)
+print('Option settings:')
+print('    Raw frame shape: {}, {:,} ROIs checked per transform'.format(
+    SHAPE, NUM_ROIS))
+for percent in PERCENTS:
+    size = (SHAPE[1] * percent // 100, SHAPE[0] * percent // 100)
+    worst = 0
+    for vflip in (False, True):
+        eager = LazyFrame(raw, vflip=vflip, size=size).image()
+        for i in range(NUM_ROIS):
+            x1, x2 = sorted(rng.integers(0, size[0] + 1, 2))
+            y1, y2 = sorted(rng.integers(0, size[1] + 1, 2))
+            lazy_roi = LazyFrame(raw, vflip=vflip, size=size)[y1:y2, x1:x2]
+            eager_roi = eager[y1:y2, x1:x2]
+            assert lazy_roi.shape == eager_roi.shape
+            if lazy_roi.size:
+                worst = max(worst, int(np.abs(lazy_roi.astype(np.int16)
+                                              - eager_roi).max()))
+    start = time.perf_counter()
+    for i in range(NUM_FRAMES):
+        LazyFrame(raw, vflip=True, size=size)[ROI]
+    lazy = (time.perf_counter() - start) / NUM_FRAMES
+    start = time.perf_counter()
+    for i in range(NUM_FRAMES):
+        LazyFrame(raw, vflip=True, size=size).image()[ROI]
+    whole = (time.perf_counter() - start) / NUM_FRAMES
+    print('resize_width {}% ({} x {}):'.format(percent, *size))
+    print('    Largest pixel difference from eager ROIs: {}'.format(worst))
+    print('    Mean time per frame: lazy ROI {:.3f} ms, eager {:.3f} ms'.format(
+        1000 * lazy, 1000 * whole))
+    assert worst == 0, 'LazyFrame ROI differs from the eager ROI'
@@ -0,0 +1,111 @@
+"""motion_buffers_test.py -- time the motion detector image steps 2 ways
+
+The motion detector runs the same image processing steps on the ROI of every
+frame: accumulate the blurred grayscale ROI into a background average, take
+the absolute difference from the average, threshold and dilate it and find
+its contours. This test program compares 2 ways of doing these steps:
+
+    Allocating: each step returns a new image, the average is float64 and
+        findContours is given a copy (the way detect_motion used to be)
+    Preallocated: each step writes into a work image allocated once at ROI
+        size, the average is float32 and findContours is given no copy (the
+        way detect_motion is now, see RunningAverage in tools/background.py)
+
+For each way, it prints the mean time per frame, the number of new images
+allocated per frame and the peak image bytes allocated during a frame (from
+tracemalloc, which traces the numpy arrays OpenCV returns).
+"""
+
+import time
+import tracemalloc
+import cv2
+import numpy as np
+
+NUM_FRAMES = 500  # How many frames to process for each test
+SHAPE = (480, 640)  # ROI shape; try (240, 320) and (1080, 1920)
+BLUR_KERNEL_SIZE = 15
+DELTA_THRESHOLD = 5
+
+class Allocating:
+    def __init__(self, gray):
+        self.average = gray.copy().astype('float')
+
+    def step(self, gray):
+        cv2.accumulateWeighted(gray, self.average, 0.5)
+        average_gray = cv2.convertScaleAbs(self.average)
+        frameDelta = cv2.absdiff(gray, average_gray)
+        thresholded = cv2.threshold(frameDelta, DELTA_THRESHOLD,
+                                    255, cv2.THRESH_BINARY)[1]
+        dilated = cv2.dilate(thresholded, None, iterations=2)
+        contours_copy = dilated.copy()
+        contours = cv2.findContours(contours_copy, cv2.RETR_EXTERNAL,
+                                    cv2.CHAIN_APPROX_SIMPLE)[-2]
+        return contours, [average_gray, frameDelta, thresholded, dilated,
+                          contours_copy]
+
+class Preallocated:
+    def __init__(self, gray):
+        self.average = gray.astype(np.float32)
+        self.average_gray = np.empty_like(gray)
+        self.frame_delta = np.empty_like(gray)
+        self.thresholded = np.empty_like(gray)
+        self.dilated = np.empty_like(gray)
+
+    def step(self, gray):
+        cv2.accumulateWeighted(gray, self.average, 0.5)
+        average_gray = cv2.convertScaleAbs(self.average, dst=self.average_gray)
+        frameDelta = cv2.absdiff(gray, average_gray, dst=self.frame_delta)
+        thresholded = cv2.threshold(frameDelta, DELTA_THRESHOLD, 255,
+                                    cv2.THRESH_BINARY, dst=self.thresholded)[1]
+        dilated = cv2.dilate(thresholded, None, dst=self.dilated, iterations=2)
+        contours = cv2.findContours(dilated, cv2.RETR_EXTERNAL,
+                                    cv2.CHAIN_APPROX_SIMPLE)[-2]
+        return contours, [average_gray, frameDelta, thresholded, dilated]
+
+def make_frames():
+    """ Blurred grayscale frames of a square moving across a noisy background
+    """
+    rng = np.random.default_rng(0)
+    background = rng.integers(0, 255, SHAPE, dtype=np.uint8)
+    frames = []
+    for i in range(20):
+        frame = background.copy()
+        x = i * (SHAPE[1] - 100) // 20
+        frame[100:200, x:x + 100] = 255
+        frames.append(cv2.GaussianBlur(frame, (BLUR_KERNEL_SIZE,
+                                               BLUR_KERNEL_SIZE), 0))
+    return frames
+
+def new_images(detector, images):
+    buffers = [value for value in vars(detector).values()
+               if isinstance(value, np.ndarray)]
+    return sum(1 for image in images
+               if not any(np.shares_memory(image, buf) for buf in buffers))
+
+def time_detector(detector_class, frames):
+    detector = detector_class(frames[0])
+    start = time.perf_counter()
+    for i in range(NUM_FRAMES):
+        detector.step(frames[i % len(frames)])
+    seconds = time.perf_counter() - start
+    tracemalloc.start()
+    current = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    contours, images = detector.step(frames[1])
+    peak_bytes = tracemalloc.get_traced_memory()[1] - current
+    tracemalloc.stop()
+    return seconds, new_images(detector, images), peak_bytes
+
+frames = make_frames()
+print('Motion Buffers Test Program: ', __file__)
+print('Option settings:')
+print('    ROI shape: {} = {:,} bytes'.format(SHAPE, frames[0].nbytes))
+print('    Requested Frames: {:,}'.format(NUM_FRAMES))
+for name, detector_class in (('Allocating', Allocating),
+                             ('Preallocated', Preallocated)):
+    seconds, count, peak_bytes = time_detector(detector_class, frames)
+    print(name + ':')
+    print('    Mean time per frame: {:.3f} ms'.format(
+        1000 * seconds / NUM_FRAMES))
+    print('    New images per frame: {}'.format(count))
+    print('    Peak bytes allocated per frame: {:,}'.format(peak_bytes))
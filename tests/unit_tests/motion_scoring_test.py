@@ -0,0 +1,161 @@
+"""motion_scoring_test.py -- check and time the 2 motion_scoring options
+
+The motion_scoring option of a motion detector chooses how the dilated motion
+pixels of each ROI are scored. With 'contours', the contours are found and
+the ROI is 'moving' if any contour has an area of at least min_area. With
+'fast', Detector.provably_still() first checks a bound on the contour areas
+from the bounding box of all the motion pixels, and only finds the contours
+if the bound is not below min_area. The 'fast' decision must always be the
+'contours' decision. This test program checks that it is and times both:
+
+    on the motion masks of footage, with the motion detector's blur,
+    background and dilate steps, at each of several min_area settings
+    on NUM_RANDOM random masks of blobs of random sizes and random min_area
+        settings, to try many masks near the min_area boundary
+
+For each, it prints the number of frames where the decisions differ (it must
+be 0), the percent of frames the fast check found 'still' without finding
+contours and the mean time per frame of each option.
+
+Run it with a replay source (an image directory, a video file or a frame
+archive recorded with the camera 'record' option):
+
+    python motion_scoring_test.py ~/imagenode_data/barn_night.frames
+
+or without one to use synthetic footage: a noisy scene with lighting flicker
+and squares of several sizes moving across it.
+"""
+
+import os
+import sys
+import time
+from types import SimpleNamespace
+import cv2
+import numpy as np
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..',
+                                'imagenode'))
+from tools.background import background_model
+from tools.imaging import Detector, ReplayStream
+
+NUM_FRAMES = 600  # How many synthetic frames
+NUM_RANDOM = 20000  # How many random masks
+SHAPE = (240, 320)  # Synthetic frame and random mask shape
+FLICKER = 8  # Synthetic lighting flicker, up to this many gray levels
+DELTA_THRESHOLD = 5  # motion detector settings
+MIN_AREAS = (1, 3, 5, 10)  # in percent of the frame
+BLUR_KERNEL_SIZE = 15
+
+def synthetic_frames():
+    """ Return synthetic footage with squares of several sizes moving
+    """
+    rng = np.random.default_rng(0)
+    scene = cv2.GaussianBlur(rng.integers(0, 255, SHAPE, dtype=np.uint8),
+                             (31, 31), 0)
+    frames = []
+    for i in range(NUM_FRAMES):
+        flicker = int(rng.integers(-FLICKER, FLICKER + 1))
+        noise = rng.normal(0, 2, SHAPE)
+        frame = np.clip(scene.astype(np.float32) + flicker + noise, 0, 255)
+        frame = frame.astype(np.uint8)
+        side = (10, 20, 30, 45, 60, 0)[(i // 50) % 6]  # 0 is no motion
+        if side:
+            x = (i * 5) % (SHAPE[1] - side)
+            frame[90:90 + side, x:x + side] = 255
+        frames.append(cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR))
+    return frames
+
+def replay_frames(src):
+    replay = ReplayStream(src)
+    frames = []
+    frame = replay.next_frame()
+    while frame is not None:
+        frames.append(np.array(frame))
+        frame = replay.next_frame()
+    return frames
+
+def footage_masks(frames):
+    """ Return the dilated motion mask of each frame, as the detector makes it
+    """
+    model = background_model('average', DELTA_THRESHOLD)
+    masks = []
+    for image in frames:
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        gray = cv2.GaussianBlur(gray, (BLUR_KERNEL_SIZE, BLUR_KERNEL_SIZE), 0)
+        thresholded = model.apply(gray)[1]
+        masks.append(cv2.dilate(thresholded, None, iterations=2))
+    return masks
+
+def random_masks():
+    """ Return (mask, min_area_pixels) pairs of random blobs and min_areas
+    """
+    rng = np.random.default_rng(1)
+    pairs = []
+    for i in range(NUM_RANDOM):
+        mask = np.zeros(SHAPE, dtype=np.uint8)
+        for blob in range(int(rng.integers(0, 4))):
+            w, h = rng.integers(1, 60, 2)
+            x = int(rng.integers(0, SHAPE[1] - w))
+            y = int(rng.integers(0, SHAPE[0] - h))
+            if rng.random() < 0.5:
+                mask[y:y + h, x:x + w] = 255
+            else:
+                cv2.ellipse(mask, (x + w // 2, y + h // 2), (w // 2, h // 2),
+                            float(rng.integers(0, 180)), 0, 360, 255, -1)
+        mask = cv2.dilate(mask, None, iterations=2)
+        pairs.append((mask, int(rng.integers(1, 2500))))
+    return pairs
+
+def contours_moving(mask, min_area_pixels):
+    contours = cv2.findContours(mask, cv2.RETR_EXTERNAL,
+                                cv2.CHAIN_APPROX_SIMPLE)[-2]
+    return any(cv2.contourArea(c) >= min_area_pixels for c in contours)
+
+def score(pairs):
+    """ Return mismatches, percent provably still and seconds per frame
+    """
+    start = time.perf_counter()
+    contour_states = [contours_moving(mask, min_area)
+                      for mask, min_area in pairs]
+    contour_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    fast_states = []
+    provably_still = 0
+    for mask, min_area in pairs:
+        detector = SimpleNamespace(min_area_pixels=min_area)
+        if Detector.provably_still(detector, mask):
+            provably_still += 1
+            fast_states.append(False)
+        else:
+            fast_states.append(contours_moving(mask, min_area))
+    fast_seconds = time.perf_counter() - start
+    mismatches = sum(c != f for c, f in zip(contour_states, fast_states))
+    return (mismatches, 100 * provably_still / len(pairs),
+            contour_seconds / len(pairs), fast_seconds / len(pairs))
+
+def report(name, pairs):
+    mismatches, still, contour_seconds, fast_seconds = score(pairs)
+    print(name + ':')
+    print('    Decisions that differ: {:,} of {:,}'.format(mismatches,
+                                                          len(pairs)))
+    print('    Found still without contours: {:.1f}%'.format(still))
+    print('    Mean time per frame: contours {:.3f} ms, fast {:.3f} ms'.format(
+        1000 * contour_seconds, 1000 * fast_seconds))
+    return mismatches
+
+if len(sys.argv) > 1:
+    frames = replay_frames(sys.argv[1])
+else:
+    frames = synthetic_frames()
+masks = footage_masks(frames)
+print('Motion Scoring Test Program: ', __file__)
+print('Option settings:')
+print('    Frames: {:,} of shape {}'.format(len(frames), frames[0].shape))
+print('    delta_threshold: {}, blur_kernel_size: {}'.format(
+    DELTA_THRESHOLD, BLUR_KERNEL_SIZE))
+mismatches = 0
+for min_area in MIN_AREAS:
+    min_area_pixels = masks[0].size * min_area // 100
+    mismatches += report('Footage, min_area {}%'.format(min_area),
+                         [(mask, min_area_pixels) for mask in masks])
+mismatches += report('Random masks', random_masks())
+assert mismatches == 0, "'fast' motion_scoring differs from 'contours'"